@@ -1,11 +1,17 @@
 import streamlit as st
-import psycopg2
-import psycopg2.pool
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from io import BytesIO
 import os
+import sys
 import time
+from functools import wraps
+
+import database
+from database import METODOS_PAGO
+import metricas
+import perfilador
+import resiliencia
 
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image
 from reportlab.lib import colors
@@ -16,28 +22,68 @@ from reportlab.lib.units import inch
 # CONFIG
 # --------------------------------
 st.set_page_config(page_title="Sistema Comercial - NSJ CAPROYECT", layout="wide")
+inicio_rerun = time.perf_counter()
+# Los fragmentos lo leen para saber si corren dentro de una ejecución completa
+ejecucion_completa = True
 
 # --------------------------------
-# CONEXIÓN BD CON POOL
+# MÉTRICAS
 # --------------------------------
 @st.cache_resource
-def get_connection_pool():
-    return psycopg2.pool.SimpleConnectionPool(
-        1, 5,
-        host=st.secrets["DB_HOST"],
-        database=st.secrets["DB_NAME"],
-        user=st.secrets["DB_USER"],
-        password=st.secrets["DB_PASSWORD"],
-        port=st.secrets["DB_PORT"]
-    )
+def iniciar_metricas():
+    try:
+        return metricas.iniciar_servidor(
+            st.secrets.get("METRICS_PORT", 9108),
+            st.secrets.get("METRICS_HOST", "127.0.0.1")
+        )
+    except OSError:
+        # Puerto ocupado (otro proceso ya expone métricas): la app sigue sin endpoint
+        return None
+
+iniciar_metricas()
+
+def medir_rerun_de_fragmento(funcion):
+    """Va debajo de @st.fragment: un rerun solo del fragmento no pasa por el final del script."""
+    @wraps(funcion)
+    def envoltura(*args, **kwargs):
+        # Streamlit vuelve a llamar a la función de la última ejecución completa,
+        # cuyo ejecucion_completa ya quedó en False al terminar
+        if ejecucion_completa:
+            return funcion(*args, **kwargs)
+        with metricas.RERUN_SEGUNDOS.medir(tipo="fragmento"):
+            return funcion(*args, **kwargs)
+    return envoltura
 
-def conectar():
-    pool = get_connection_pool()
-    return pool.getconn()
+# --------------------------------
+# REPOSITORIO (POSTGRES O SQLITE)
+# --------------------------------
+@st.cache_resource
+def obtener_repositorio():
+    repositorio = database.crear_repositorio(st.secrets)
+    repositorio.asegurar_esquema()
+    return repositorio
 
-def liberar_conexion(conn):
-    pool = get_connection_pool()
-    pool.putconn(conn)
+@st.cache_resource
+def obtener_lecturas():
+    return resiliencia.Lecturas(obtener_repositorio().errores_transitorios)
+
+def leer_panel_con_estado(panel, funcion, dia=None, consulta=None):
+    """
+    Lectura de un panel con reintentos. Devuelve (valor, obsoleto): si la base
+    no responde, la última copia buena con obsoleto=True avisando que está
+    desactualizada, o (None, False) si no hay.
+    """
+    try:
+        valor, obsoleto_desde = obtener_lecturas().leer(panel, funcion, dia, consulta)
+    except resiliencia.BaseNoDisponible:
+        st.error("❌ No se pudo conectar con la base de datos. Intenta de nuevo en unos segundos.")
+        return None, False
+    if obsoleto_desde is not None:
+        st.warning(f"⚠️ La base de datos no responde. Mostrando datos de las {obsoleto_desde.strftime('%H:%M:%S')}.")
+    return valor, obsoleto_desde is not None
+
+def leer_panel(panel, funcion, dia=None, consulta=None):
+    return leer_panel_con_estado(panel, funcion, dia, consulta)[0]
 
 # --------------------------------
 # FUNCIONES BD
@@ -46,217 +92,72 @@ def hora_peru():
     return datetime.now(ZoneInfo("America/Lima"))
 
 def registrar_venta(venta):
-    conn = conectar()
-    try:
-        cur = conn.cursor()
-        fecha_peru = hora_peru()
-
-        cur.execute("""
-            INSERT INTO ventas
-            (cliente, producto, total, pagado, saldo, estado, metodo_pago, entrega, fecha)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (
-            venta["Cliente"], venta["Producto"], venta["Total"],
-            venta["Pagado"], venta["Saldo"], venta["Estado"],
-            venta["Método de pago"], venta["Entrega"], fecha_peru
-        ))
-
-        venta_id = cur.fetchone()[0]
-
-        if venta["Pagado"] > 0:
-            cur.execute("""
-                INSERT INTO pagos (venta_id, fecha, monto, metodo)
-                VALUES (%s, %s, %s, %s)
-            """, (venta_id, fecha_peru, venta["Pagado"], venta["Método de pago"]))
-
-        conn.commit()
-        st.session_state.mensaje_exito = f"✅ Venta #{venta_id} registrada correctamente"
-    finally:
-        liberar_conexion(conn)
+    with metricas.medir_operacion("registrar_venta"):
+        venta_id = obtener_repositorio().registrar_venta(venta, hora_peru())
+    metricas.VENTAS_REGISTRADAS.inc(metodo=venta["Método de pago"])
+    metricas.MONTO_VENDIDO.inc(float(venta["Total"]))
+    st.session_state.mensaje_exito = f"✅ Venta #{venta_id} registrada correctamente"
     st.rerun()
 
-def completar_pago(id_venta, saldo_actual, metodo_pago):
-    conn = conectar()
+def completar_pago(id_venta, metodo_pago):
     try:
-        cur = conn.cursor()
-        cur.execute("""
-            INSERT INTO pagos (venta_id, fecha, monto, metodo)
-            VALUES (%s, %s, %s, %s)
-        """, (id_venta, hora_peru(), saldo_actual, metodo_pago))
-
-        cur.execute("""
-            UPDATE ventas
-            SET pagado = pagado + %s, saldo = 0, estado = 'Pagado'
-            WHERE id = %s
-        """, (saldo_actual, id_venta))
-
-        conn.commit()
-        st.session_state.mensaje_exito = f"✅ Pago completado correctamente (S/. {saldo_actual:.2f})"
-    finally:
-        liberar_conexion(conn)
+        with metricas.medir_operacion("completar_pago"):
+            monto = obtener_repositorio().completar_pago(id_venta, metodo_pago, hora_peru())
+    except database.VentaNoEncontrada:
+        st.error("❌ La venta ya no existe: otro usuario la eliminó")
+        return
+    if monto == 0:
+        # Un segundo clic o otra sesión ya la pagó
+        st.session_state.mensaje_exito = "✅ La venta ya estaba pagada"
+    else:
+        metricas.PAGOS_COMPLETADOS.inc(metodo=metodo_pago)
+        st.session_state.mensaje_exito = f"✅ Pago completado correctamente (S/. {monto:.2f})"
     st.rerun()
 
 def marcar_entrega(id_venta, estado):
-    conn = conectar()
-    try:
-        cur = conn.cursor()
-        cur.execute("UPDATE ventas SET entrega=%s WHERE id=%s", (estado, id_venta))
-        conn.commit()
-        st.session_state.mensaje_exito = f"✅ Entrega marcada como: {estado}"
-    finally:
-        liberar_conexion(conn)
+    obtener_repositorio().marcar_entrega(id_venta, estado)
+    st.session_state.mensaje_exito = f"✅ Entrega marcada como: {estado}"
     st.rerun()
 
 def eliminar_venta(id_venta):
-    conn = conectar()
-    try:
-        cur = conn.cursor()
-        cur.execute("DELETE FROM pagos WHERE venta_id=%s", (id_venta,))
-        cur.execute("DELETE FROM ventas WHERE id=%s", (id_venta,))
-        conn.commit()
-        st.session_state.mensaje_exito = "✅ Venta eliminada correctamente"
-    finally:
-        liberar_conexion(conn)
+    obtener_repositorio().eliminar_venta(id_venta)
+    st.session_state.mensaje_exito = "✅ Venta eliminada correctamente"
     st.rerun()
 
 def cierre_de_caja(usuario_actual):
-    conn = conectar()
-    try:
-        cur = conn.cursor()
-
-        cur.execute("""
-            SELECT id FROM ventas
-            WHERE cerrado = FALSE AND entrega = 'Entregado' AND saldo = 0
-        """)
-        ventas_ids = cur.fetchall()
-
-        if not ventas_ids:
-            return False
-
-        ids = [v[0] for v in ventas_ids]
-        
-        cur.execute("""
-            SELECT p.metodo, COALESCE(SUM(p.monto), 0) as total
-            FROM pagos p
-            WHERE p.venta_id = ANY(%s)
-            GROUP BY p.metodo
-        """, (ids,))
-        
-        pagos_por_metodo = cur.fetchall()
-
-        totales_metodo = {"Efectivo": 0, "Yape": 0, "Plin": 0, "Transferencia": 0}
-        total_general = 0
-        
-        for metodo, monto in pagos_por_metodo:
-            monto_float = float(monto)
-            total_general += monto_float
-            if metodo in totales_metodo:
-                totales_metodo[metodo] += monto_float
-
-        cur.execute("""
-            INSERT INTO cierres_caja
-            (fecha, total_general, total_efectivo, total_yape, total_plin, total_transferencia, usuario)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (
-            hora_peru().date(), total_general,
-            totales_metodo["Efectivo"], totales_metodo["Yape"],
-            totales_metodo["Plin"], totales_metodo["Transferencia"],
-            usuario_actual
-        ))
-
-        cur.execute("UPDATE ventas SET cerrado = TRUE WHERE id = ANY(%s)", (ids,))
-        conn.commit()
-        st.session_state.mensaje_exito = f"✅ Cierre realizado: S/. {total_general:.2f}"
-        return True
-    finally:
-        liberar_conexion(conn)
+    with metricas.medir_operacion("cierre_de_caja"):
+        total_general = obtener_repositorio().cierre_de_caja(usuario_actual, hora_peru())
+    if total_general is None:
+        return False
+    metricas.CIERRES.inc()
+    st.session_state.mensaje_exito = f"✅ Cierre realizado: S/. {total_general:.2f}"
+    return True
 
 @st.cache_data(ttl=60)
 def obtener_cierres():
-    conn = conectar()
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT fecha, total_general, total_efectivo, total_yape, total_plin,
-                   total_transferencia, usuario, created_at
-            FROM cierres_caja
-            ORDER BY created_at DESC
-        """)
-        data = cur.fetchall()
-    finally:
-        liberar_conexion(conn)
-    return data
+    return obtener_repositorio().obtener_cierres()
 
 def obtener_ventas():
-    conn = conectar()
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT id, fecha, cliente, producto, total, pagado, saldo, estado, metodo_pago, entrega
-            FROM ventas
-            WHERE cerrado = FALSE
-            ORDER BY fecha DESC
-        """)
-        rows = cur.fetchall()
-    finally:
-        liberar_conexion(conn)
-
-    ventas = []
-    for r in rows:
-        fecha_peru = r[1].astimezone(ZoneInfo("America/Lima"))
-        ventas.append({
-            "id": r[0], "Fecha": fecha_peru, "Cliente": r[2], "Producto": r[3],
-            "Total": float(r[4]), "Pagado": float(r[5]), "Saldo": float(r[6]),
-            "Estado": r[7], "Método de pago": r[8], "Entrega": r[9]
-        })
-    return ventas
+    return obtener_repositorio().listar_ventas()
 
 # --------------------------------
 # FRAGMENTOS OPTIMIZADOS
 # --------------------------------
 @st.fragment
+@perfilador.perfilado("fragmento mostrar_ventas")
+@medir_rerun_de_fragmento
 def mostrar_ventas():
-    conn = conectar()
-    try:
-        cur = conn.cursor()
-        
-        # Consulta optimizada con fecha correcta
-        cur.execute("""
-            SELECT 
-                (SELECT COALESCE(SUM(total),0) FROM ventas 
-                 WHERE DATE(fecha AT TIME ZONE 'America/Lima') = DATE(NOW() AT TIME ZONE 'America/Lima')) as total_vendido,
-                (SELECT COALESCE(SUM(monto),0) FROM pagos 
-                 WHERE DATE(fecha AT TIME ZONE 'America/Lima') = DATE(NOW() AT TIME ZONE 'America/Lima')) as total_cobrado,
-                (SELECT COALESCE(SUM(saldo),0) FROM ventas 
-                 WHERE DATE(fecha AT TIME ZONE 'America/Lima') = DATE(NOW() AT TIME ZONE 'America/Lima')) as total_pendiente
-        """)
-        
-        totales = cur.fetchone()
-        total_vendido = float(totales[0])
-        total_cobrado = float(totales[1])
-        total_pendiente = float(totales[2])
-        
-        # Ventas no cerradas de hoy
-        cur.execute("""
-            SELECT id, fecha, cliente, producto, total, pagado, saldo, estado, metodo_pago, entrega
-            FROM ventas
-            WHERE cerrado = FALSE
-            AND DATE(fecha AT TIME ZONE 'America/Lima') = DATE(NOW() AT TIME ZONE 'America/Lima')
-            ORDER BY fecha DESC
-        """)
-        rows = cur.fetchall()
-    finally:
-        liberar_conexion(conn)
-
-    ventas = []
-    for r in rows:
-        fecha_peru = r[1].astimezone(ZoneInfo("America/Lima"))
-        ventas.append({
-            "id": r[0], "Fecha": fecha_peru, "Cliente": r[2], "Producto": r[3],
-            "Total": float(r[4]), "Pagado": float(r[5]), "Saldo": float(r[6]),
-            "Estado": r[7], "Método de pago": r[8], "Entrega": r[9]
-        })
+    hoy = hora_peru().date()
+    repositorio = obtener_repositorio()
+    # Totales y ventas no cerradas de hoy
+    datos, obsoleto = leer_panel_con_estado(
+        "ventas_hoy",
+        lambda: (repositorio.totales_del_dia(hoy), repositorio.listar_ventas(hoy, "hoy")),
+        dia=hoy
+    )
+    if datos is None:
+        return
+    (total_vendido, total_cobrado, total_pendiente), ventas = datos
     
     # Métricas
     col1, col2, col3 = st.columns(3)
@@ -296,6 +197,12 @@ def mostrar_ventas():
             else:
                 st.success("📦 Pedido entregado")
     
+            # Con datos de respaldo no se ofrecen acciones: la venta puede haber cambiado
+            if obsoleto:
+                st.caption("🔒 Acciones deshabilitadas hasta que vuelva la conexión")
+                st.divider()
+                continue
+
             colA, colB, colC = st.columns(3)
     
             if v["Saldo"] > 0:
@@ -305,7 +212,7 @@ def mostrar_ventas():
                         st.write(f"**Saldo pendiente:** S/. {v['Saldo']:.2f}")
                         metodo_completar = st.selectbox("Método de pago", METODOS_PAGO, key=f"metodo_pago_{v['id']}")
                         if st.button("✅ Confirmar pago", key=f"confirmar_{v['id']}", type="primary"):
-                            completar_pago(v["id"], v["Saldo"], metodo_completar)
+                            completar_pago(v["id"], metodo_completar)
     
             with colB:
                 nuevo_estado = "Entregado" if v["Entrega"] == "Pendiente" else "Pendiente"
@@ -319,29 +226,15 @@ def mostrar_ventas():
             st.divider()
 
 @st.fragment
+@perfilador.perfilado("fragmento mostrar_ventas_anteriores")
+@medir_rerun_de_fragmento
 def mostrar_ventas_anteriores():
-    conn = conectar()
-    try:
-        cur = conn.cursor()
-        cur.execute("""
-            SELECT id, fecha, cliente, producto, total, pagado, saldo, estado, metodo_pago, entrega
-            FROM ventas
-            WHERE cerrado = FALSE
-            AND DATE(fecha AT TIME ZONE 'America/Lima') < DATE(NOW() AT TIME ZONE 'America/Lima')
-            ORDER BY fecha DESC
-        """)
-        rows = cur.fetchall()
-    finally:
-        liberar_conexion(conn)
-        
-    ventas = []
-    for r in rows:
-        fecha_peru = r[1].astimezone(ZoneInfo("America/Lima"))
-        ventas.append({
-            "id": r[0], "Fecha": fecha_peru, "Cliente": r[2], "Producto": r[3],
-            "Total": float(r[4]), "Pagado": float(r[5]), "Saldo": float(r[6]),
-            "Estado": r[7], "Método de pago": r[8], "Entrega": r[9]
-        })
+    hoy = hora_peru().date()
+    ventas, obsoleto = leer_panel_con_estado(
+        "ventas_anteriores", lambda: obtener_repositorio().listar_ventas(hoy, "anteriores"), dia=hoy
+    )
+    if ventas is None:
+        return
     
     if not ventas:
         st.info("✅ No hay ventas pendientes de días anteriores")
@@ -376,6 +269,12 @@ def mostrar_ventas_anteriores():
             else:
                 st.success("📦 Pedido entregado")
     
+            # Con datos de respaldo no se ofrecen acciones: la venta puede haber cambiado
+            if obsoleto:
+                st.caption("🔒 Acciones deshabilitadas hasta que vuelva la conexión")
+                st.divider()
+                continue
+
             colA, colB, colC = st.columns(3)
     
             if v["Saldo"] > 0:
@@ -385,7 +284,7 @@ def mostrar_ventas_anteriores():
                         st.write(f"**Saldo pendiente:** S/. {v['Saldo']:.2f}")
                         metodo_completar = st.selectbox("Método de pago", METODOS_PAGO, key=f"metodo_ant_{v['id']}")
                         if st.button("✅ Confirmar pago", key=f"confirmar_ant_{v['id']}", type="primary"):
-                            completar_pago(v["id"], v["Saldo"], metodo_completar)
+                            completar_pago(v["id"], metodo_completar)
     
             with colB:
                 nuevo_estado = "Entregado" if v["Entrega"] == "Pendiente" else "Pendiente"
@@ -399,28 +298,19 @@ def mostrar_ventas_anteriores():
             st.divider()
 
 @st.fragment
+@perfilador.perfilado("fragmento mostrar_estadisticas")
+@medir_rerun_de_fragmento
 def mostrar_estadisticas():
-    conn = conectar()
-    try:
-        cur = conn.cursor()
-        
-        cur.execute("""
-            SELECT metodo, COUNT(*), COALESCE(SUM(monto),0)
-            FROM pagos
-            WHERE DATE(fecha AT TIME ZONE 'America/Lima') = DATE(NOW() AT TIME ZONE 'America/Lima')
-            GROUP BY metodo
-            ORDER BY SUM(monto) DESC
-        """)
-        resultados = cur.fetchall()
-        
-        cur.execute("""
-            SELECT COALESCE(SUM(monto),0)
-            FROM pagos
-            WHERE DATE(fecha AT TIME ZONE 'America/Lima') = DATE(NOW() AT TIME ZONE 'America/Lima')
-        """)
-        total_general = cur.fetchone()[0]
-    finally:
-        liberar_conexion(conn)
+    hoy = hora_peru().date()
+    repositorio = obtener_repositorio()
+    datos = leer_panel(
+        "estadisticas",
+        lambda: (repositorio.pagos_por_metodo(hoy), repositorio.total_cobrado(hoy)),
+        dia=hoy
+    )
+    if datos is None:
+        return
+    resultados, total_general = datos
     
     st.subheader("📊 Métodos de pago del día")
     st.metric("💰 Total cobrado hoy", f"S/. {float(total_general):.2f}")
@@ -440,332 +330,409 @@ def mostrar_estadisticas():
     else:
         st.info("No hay pagos registrados hoy.")
 
-# --------------------------------
-# AUTO-REFRESH
-# --------------------------------
-with st.sidebar:
-    st.markdown("### ⚙️ Configuración")
+def mostrar_cobranzas():
+    # Sin widgets propios: el resumen se lee una vez por ejecución completa y
+    # elegir otro cliente solo vuelve a correr mostrar_detalle_cuenta
+    hoy = hora_peru().date()
+    repositorio = obtener_repositorio()
+    rows = leer_panel("cobranzas", lambda: repositorio.cuentas_por_cobrar(hoy), dia=hoy)
+    if rows is None:
+        return
+
+    if not rows:
+        st.info("✅ Ningún cliente tiene saldo pendiente")
+        return
+
+    cuentas = [{
+        "Cliente": r[0], "0–7 días": r[1], "8–30 días": r[2],
+        "Más de 30 días": r[3], "Total": r[4],
+        "Días de la deuda más antigua": (hoy - r[5]).days
+    } for r in rows]
+
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Por cobrar (Total)", f"S/. {sum(c['Total'] for c in cuentas):.2f}")
+    col2.metric("0–7 días", f"S/. {sum(c['0–7 días'] for c in cuentas):.2f}")
+    col3.metric("8–30 días", f"S/. {sum(c['8–30 días'] for c in cuentas):.2f}")
+    col4.metric("Más de 30 días", f"S/. {sum(c['Más de 30 días'] for c in cuentas):.2f}")
+    st.divider()
+
+    st.subheader(f"💰 Clientes con saldo pendiente ({len(cuentas)})")
+    st.dataframe(
+        cuentas, hide_index=True, use_container_width=True,
+        column_config={
+            col: st.column_config.NumberColumn(format="S/. %.2f")
+            for col in ["0–7 días", "8–30 días", "Más de 30 días", "Total"]
+        }
+    )
+
+    st.divider()
+    mostrar_detalle_cuenta([c["Cliente"] for c in cuentas], hoy)
+
+@st.fragment
+@perfilador.perfilado("fragmento mostrar_detalle_cuenta")
+@medir_rerun_de_fragmento
+def mostrar_detalle_cuenta(clientes, hoy):
+    cliente = st.selectbox("🔎 Ver detalle de un cliente", clientes)
+    repositorio = obtener_repositorio()
+    detalle = leer_panel(
+        "detalle_cuenta", lambda: repositorio.detalle_cuenta(cliente), dia=hoy, consulta=cliente
+    ) or []
+
+    for fecha, saldo in detalle:
+        dias = (hoy - fecha).days
+        texto = f"📅 {fecha.strftime('%d/%m/%Y')} · {dias} día{'s' if dias != 1 else ''} · S/. {saldo:.2f}"
+        if dias > 30:
+            st.error(texto)
+        elif dias > 7:
+            st.warning(texto)
+        else:
+            st.info(texto)
+
+perfilador.iniciar_ejecucion()
+try:
+    # --------------------------------
+    # AUTO-REFRESH
+    # --------------------------------
+    with st.sidebar, perfilador.seccion("Sidebar"):
+        st.markdown("### ⚙️ Configuración")
     
-    auto_refresh = st.checkbox("🔄 Auto-actualizar cada 5s", value=False)
-    if st.button("🔄 Actualizar ahora", use_container_width=True):
-        st.rerun()
-    if auto_refresh:
-        time.sleep(5)
-        st.rerun()
+        auto_refresh = st.checkbox("🔄 Auto-actualizar cada 5s", value=False)
+        if st.button("🔄 Actualizar ahora", use_container_width=True):
+            st.rerun()
+        if auto_refresh:
+            # La espera no es trabajo del rerun: se descuenta de su duración
+            inicio_espera = time.perf_counter()
+            time.sleep(5)
+            inicio_rerun += time.perf_counter() - inicio_espera
+            st.rerun()
     
-    st.divider()
-    st.caption(f"Última actualización: {hora_peru().strftime('%H:%M:%S')}")
+        st.divider()
+        st.caption(f"Última actualización: {hora_peru().strftime('%H:%M:%S')}")
     
-    # ✅ SECCIÓN DE REINICIO
-    st.divider()
-    st.markdown("### ⚠️ Zona de Peligro")
+        # 🩺 PERFILADO (solo administración)
+        # Solo si el despliegue lo habilita: la captura ve el trabajo de todas las sesiones
+        if st.secrets.get("PROFILER_ENABLED", False):
+            st.divider()
+            with st.expander("🩺 Perfilado"):
+                perfil = perfilador.actual()
+                st.checkbox("Medir secciones de cada ejecución", key="perfilado_activo")
+                if perfil.aviso:
+                    st.warning(perfil.aviso)
+                    perfil.aviso = None
+
+                if st.button("🎯 Capturar cProfile de una ejecución", use_container_width=True):
+                    perfil.captura_pendiente = True
+                    st.rerun()
+
+                desglose = perfil.desglose()
+                if desglose:
+                    st.dataframe(desglose, hide_index=True, use_container_width=True)
+                elif st.session_state.get("perfilado_activo"):
+                    st.caption("Aún no hay ejecuciones medidas.")
+
+                if perfil.captura:
+                    captura = perfil.captura
+                    st.caption(
+                        f"Captura de las {captura['inicio'].strftime('%H:%M:%S')} · "
+                        f"{captura['total'] * 1000:.0f} ms" + (" · cortada por st.rerun()" if captura["interrumpida"] else "")
+                    )
+                    st.download_button(
+                        "📥 Descargar .pstats",
+                        captura["datos"],
+                        f"rerun_{captura['inicio'].strftime('%Y%m%d_%H%M%S')}.pstats",
+                        "application/octet-stream",
+                        use_container_width=True
+                    )
+                    with st.popover("Ver funciones más costosas"):
+                        st.code(captura["resumen"])
+
+        # ✅ SECCIÓN DE REINICIO
+        st.divider()
+        st.markdown("### ⚠️ Zona de Peligro")
     
-    with st.expander("🗑️ Limpiar datos del día"):
-        st.warning("⚠️ **ADVERTENCIA**: Esto eliminará TODOS los datos de hoy (ventas, pagos y estadísticas). Esta acción NO se puede deshacer.")
+        with st.expander("🗑️ Limpiar datos del día"):
+            st.warning("⚠️ **ADVERTENCIA**: Esto eliminará TODOS los datos de hoy (ventas, pagos y estadísticas). Esta acción NO se puede deshacer.")
         
-        confirmar = st.checkbox("Entiendo que esto borrará todo")
+            confirmar = st.checkbox("Entiendo que esto borrará todo")
         
-        if confirmar:
-            if st.button("🔥 BORRAR TODO DEL DÍA", type="primary", use_container_width=True):
-                conn = conectar()
-                try:
-                    cur = conn.cursor()
-                    
-                    # Eliminar pagos de hoy
-                    cur.execute("""
-                        DELETE FROM pagos
-                        WHERE DATE(fecha AT TIME ZONE 'America/Lima') = DATE(NOW() AT TIME ZONE 'America/Lima')
-                    """)
-                    pagos_eliminados = cur.rowcount
-                    
-                    # Eliminar ventas de hoy
-                    cur.execute("""
-                        DELETE FROM ventas
-                        WHERE DATE(fecha AT TIME ZONE 'America/Lima') = DATE(NOW() AT TIME ZONE 'America/Lima')
-                    """)
-                    ventas_eliminadas = cur.rowcount
-                    
-                    conn.commit()
+            if confirmar:
+                if st.button("🔥 BORRAR TODO DEL DÍA", type="primary", use_container_width=True):
+                    ventas_eliminadas, pagos_eliminados = obtener_repositorio().limpiar_dia(hora_peru().date())
                     st.success(f"✅ Eliminadas {ventas_eliminadas} ventas y {pagos_eliminados} pagos del día")
                     st.cache_data.clear()  # Limpiar cache
                     time.sleep(1)
-                finally:
-                    liberar_conexion(conn)
-                st.rerun()
-# --------------------------------
-# INTERFAZ
-# --------------------------------
-st.title("Sistema Comercial - NSJ CAPROYECT")
-st.divider()
-
-METODOS_PAGO = ["Efectivo", "Yape", "Plin", "Transferencia"]
-
-tab_venta, tab_ventas, tab_anteriores, tab_estadisticas, tab_reporte = st.tabs(
-    ["➕ Nueva Venta", "📊 Ventas Hoy", "📋 Ventas Anteriores", "📈 Estadísticas", "📄 Reporte"]
-)
-
-# ======================================
-# NUEVA VENTA
-# ======================================
-with tab_venta:
-    if "mensaje_exito" in st.session_state:
-        st.success(st.session_state.mensaje_exito)
-        del st.session_state.mensaje_exito
+                    st.rerun()
+    # --------------------------------
+    # INTERFAZ
+    # --------------------------------
+    st.title("Sistema Comercial - NSJ CAPROYECT")
+    st.divider()
+
+    tab_venta, tab_ventas, tab_anteriores, tab_cobranzas, tab_estadisticas, tab_reporte = st.tabs(
+        ["➕ Nueva Venta", "📊 Ventas Hoy", "📋 Ventas Anteriores", "💰 Cobranzas", "📈 Estadísticas", "📄 Reporte"]
+    )
+
+    # ======================================
+    # NUEVA VENTA
+    # ======================================
+    with tab_venta, perfilador.seccion("Tab Nueva Venta"):
+        if "mensaje_exito" in st.session_state:
+            st.success(st.session_state.mensaje_exito)
+            del st.session_state.mensaje_exito
     
-    cliente = st.text_input("Cliente")
-    producto = st.text_input("Producto")
-    total = st.number_input("Total", min_value=0.0)
-    metodo_pago = st.selectbox("Método de pago", METODOS_PAGO)
-    tipo_pago = st.radio("Tipo de pago", ["Pago completo", "Adelanto"])
-
-    if tipo_pago == "Pago completo":
-        pagado = total
-        saldo = 0
-        estado = "Pagado"
-    else:
-        adelanto = st.number_input("Monto adelanto", min_value=0.0)
-        pagado = adelanto
-        saldo = total - adelanto
-        estado = "Pendiente" if saldo > 0 else "Pagado"
-
-    entrega = st.selectbox("Estado de entrega", ["Pendiente", "Entregado"])
-
-    if st.button("Registrar venta"):
-        registrar_venta({
-            "Cliente": cliente, "Producto": producto, "Total": total,
-            "Pagado": pagado, "Saldo": saldo, "Estado": estado,
-            "Método de pago": metodo_pago, "Entrega": entrega
-        })
-
-# ======================================
-# VENTAS HOY
-# ======================================
-with tab_ventas:
-    if "mensaje_exito" in st.session_state:
-        st.success(st.session_state.mensaje_exito)
-        del st.session_state.mensaje_exito
-    mostrar_ventas()
-
-# ======================================
-# VENTAS ANTERIORES
-# ======================================
-with tab_anteriores:
-    if "mensaje_exito" in st.session_state:
-        st.success(st.session_state.mensaje_exito)
-        del st.session_state.mensaje_exito
-    mostrar_ventas_anteriores()
-
-# ======================================
-# ESTADÍSTICAS
-# ======================================
-with tab_estadisticas:
-    mostrar_estadisticas()
-
-# ======================================
-# REPORTE
-# ======================================
-with tab_reporte:
-    ventas = obtener_ventas()
-
-    st.subheader("📄 Reporte Profesional")
+        cliente = st.text_input("Cliente")
+        producto = st.text_input("Producto")
+        total = st.number_input("Total", min_value=0.0)
+        metodo_pago = st.selectbox("Método de pago", METODOS_PAGO)
+        tipo_pago = st.radio("Tipo de pago", ["Pago completo", "Adelanto"])
+
+        if tipo_pago == "Pago completo":
+            pagado = total
+            saldo = 0
+            estado = "Pagado"
+        else:
+            adelanto = st.number_input("Monto adelanto", min_value=0.0)
+            pagado = adelanto
+            saldo = total - adelanto
+            estado = "Pendiente" if saldo > 0 else "Pagado"
 
-    if not ventas:
-        st.warning("No hay ventas para generar reporte")
-    else:
-        if st.button("Generar PDF"):
-            buffer = BytesIO()
-            doc = SimpleDocTemplate(buffer)
-            elementos = []
-            estilos = getSampleStyleSheet()
-
-            # LOGO
-            if os.path.exists("logo.png"):
-                logo = Image("logo.png", width=2*inch, height=1*inch)
-                elementos.append(logo)
-
-            elementos.append(Spacer(1, 10))
-            
-            # ENCABEZADO
-            elementos.append(Paragraph("<b>SISTEMA COMERCIAL</b>", estilos["Title"]))
-            elementos.append(Paragraph("<b>NSJ CAPROYECT</b>", estilos["Heading2"]))
-            elementos.append(Spacer(1, 5))
-            elementos.append(Paragraph(f"Fecha de emisión: {hora_peru().strftime('%d/%m/%Y %H:%M')}", estilos["Normal"]))
-            elementos.append(Spacer(1, 20))
-
-            # TOTALES GENERALES
-            total_vendido = sum(v["Total"] for v in ventas)
-            total_pagado = sum(v["Pagado"] for v in ventas)
-            total_pendiente = sum(v["Saldo"] for v in ventas)
-
-            resumen_data = [
-                ["Total Vendido", f"S/. {total_vendido:.2f}"],
-                ["Total Cobrado", f"S/. {total_pagado:.2f}"],
-                ["Total Pendiente", f"S/. {total_pendiente:.2f}"],
-            ]
-
-            tabla_resumen = Table(resumen_data, colWidths=[250, 150])
-            tabla_resumen.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, -1), colors.lightgrey),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-                ('FONTSIZE', (0, 0), (-1, -1), 11),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
-            ]))
-
-            elementos.append(tabla_resumen)
-            elementos.append(Spacer(1, 25))
-
-            # ✅ ESTADÍSTICAS POR MÉTODO DE PAGO
-            conn = conectar()
-            try:
-                cur = conn.cursor()
-                
-                # Obtener estadísticas de pagos
-                cur.execute("""
-                    SELECT metodo, COUNT(*), COALESCE(SUM(monto),0)
-                    FROM pagos
-                    WHERE DATE(fecha AT TIME ZONE 'America/Lima') = DATE(NOW() AT TIME ZONE 'America/Lima')
-                    GROUP BY metodo
-                    ORDER BY SUM(monto) DESC
-                """)
-                estadisticas = cur.fetchall()
-                
-                # Total cobrado hoy
-                cur.execute("""
-                    SELECT COALESCE(SUM(monto),0)
-                    FROM pagos
-                    WHERE DATE(fecha AT TIME ZONE 'America/Lima') = DATE(NOW() AT TIME ZONE 'America/Lima')
-                """)
-                total_cobrado_hoy = float(cur.fetchone()[0])
-                
-            finally:
-                liberar_conexion(conn)
+        entrega = st.selectbox("Estado de entrega", ["Pendiente", "Entregado"])
+
+        if st.button("Registrar venta"):
+            if saldo < 0:
+                st.error("❌ El adelanto no puede ser mayor que el total")
+            else:
+                registrar_venta({
+                    "Cliente": cliente, "Producto": producto, "Total": total,
+                    "Pagado": pagado, "Saldo": saldo, "Estado": estado,
+                    "Método de pago": metodo_pago, "Entrega": entrega
+                })
+
+    # ======================================
+    # VENTAS HOY
+    # ======================================
+    with tab_ventas, perfilador.seccion("Tab Ventas Hoy"):
+        if "mensaje_exito" in st.session_state:
+            st.success(st.session_state.mensaje_exito)
+            del st.session_state.mensaje_exito
+        mostrar_ventas()
+
+    # ======================================
+    # VENTAS ANTERIORES
+    # ======================================
+    with tab_anteriores, perfilador.seccion("Tab Ventas Anteriores"):
+        if "mensaje_exito" in st.session_state:
+            st.success(st.session_state.mensaje_exito)
+            del st.session_state.mensaje_exito
+        mostrar_ventas_anteriores()
+
+    # ======================================
+    # COBRANZAS
+    # ======================================
+    with tab_cobranzas, perfilador.seccion("Tab Cobranzas"):
+        mostrar_cobranzas()
+
+    # ======================================
+    # ESTADÍSTICAS
+    # ======================================
+    with tab_estadisticas, perfilador.seccion("Tab Estadísticas"):
+        mostrar_estadisticas()
+
+    # ======================================
+    # REPORTE
+    # ======================================
+    with tab_reporte, perfilador.seccion("Tab Reporte"):
+        ventas = leer_panel("ventas", obtener_ventas)
+
+        st.subheader("📄 Reporte Profesional")
+
+        if ventas == []:
+            st.warning("No hay ventas para generar reporte")
+        elif ventas:
+            if st.button("Generar PDF"):
+                buffer = BytesIO()
+                doc = SimpleDocTemplate(buffer)
+                elementos = []
+                estilos = getSampleStyleSheet()
+
+                # LOGO
+                if os.path.exists("logo.png"):
+                    logo = Image("logo.png", width=2*inch, height=1*inch)
+                    elementos.append(logo)
 
-            if estadisticas:
-                elementos.append(Paragraph("<b>ESTADÍSTICAS DE PAGOS DEL DÍA</b>", estilos["Heading3"]))
                 elementos.append(Spacer(1, 10))
+            
+                # ENCABEZADO
+                elementos.append(Paragraph("<b>SISTEMA COMERCIAL</b>", estilos["Title"]))
+                elementos.append(Paragraph("<b>NSJ CAPROYECT</b>", estilos["Heading2"]))
+                elementos.append(Spacer(1, 5))
+                elementos.append(Paragraph(f"Fecha de emisión: {hora_peru().strftime('%d/%m/%Y %H:%M')}", estilos["Normal"]))
+                elementos.append(Spacer(1, 20))
+
+                # TOTALES GENERALES
+                total_vendido = sum(v["Total"] for v in ventas)
+                total_pagado = sum(v["Pagado"] for v in ventas)
+                total_pendiente = sum(v["Saldo"] for v in ventas)
+
+                resumen_data = [
+                    ["Total Vendido", f"S/. {total_vendido:.2f}"],
+                    ["Total Cobrado", f"S/. {total_pagado:.2f}"],
+                    ["Total Pendiente", f"S/. {total_pendiente:.2f}"],
+                ]
+
+                tabla_resumen = Table(resumen_data, colWidths=[250, 150])
+                tabla_resumen.setStyle(TableStyle([
+                    ('BACKGROUND', (0, 0), (-1, -1), colors.lightgrey),
+                    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+                    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+                    ('FONTSIZE', (0, 0), (-1, -1), 11),
+                    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica-Bold'),
+                ]))
+
+                elementos.append(tabla_resumen)
+                elementos.append(Spacer(1, 25))
+
+                # ✅ ESTADÍSTICAS POR MÉTODO DE PAGO
+                hoy = hora_peru().date()
+                estadisticas, total_cobrado_hoy = leer_panel(
+                    "estadisticas",
+                    lambda: (obtener_repositorio().pagos_por_metodo(hoy), obtener_repositorio().total_cobrado(hoy)),
+                    dia=hoy
+                ) or ([], 0.0)
+
+                if estadisticas:
+                    elementos.append(Paragraph("<b>ESTADÍSTICAS DE PAGOS DEL DÍA</b>", estilos["Heading3"]))
+                    elementos.append(Spacer(1, 10))
                 
-                # Tabla de estadísticas
-                estadisticas_data = [["Método de Pago", "Cantidad", "Total Recibido", "Porcentaje"]]
+                    # Tabla de estadísticas
+                    estadisticas_data = [["Método de Pago", "Cantidad", "Total Recibido", "Porcentaje"]]
                 
-                for metodo, cantidad, total in estadisticas:
-                    porcentaje = (float(total) / total_cobrado_hoy * 100) if total_cobrado_hoy > 0 else 0
+                    for metodo, cantidad, total in estadisticas:
+                        porcentaje = (float(total) / total_cobrado_hoy * 100) if total_cobrado_hoy > 0 else 0
+                        estadisticas_data.append([
+                            metodo,
+                            str(cantidad),
+                            f"S/. {float(total):.2f}",
+                            f"{porcentaje:.1f}%"
+                        ])
+                
+                    # Fila de totales
+                    total_pagos = sum(e[1] for e in estadisticas)
                     estadisticas_data.append([
-                        metodo,
-                        str(cantidad),
-                        f"S/. {float(total):.2f}",
-                        f"{porcentaje:.1f}%"
+                        "TOTAL",
+                        str(total_pagos),
+                        f"S/. {total_cobrado_hoy:.2f}",
+                        "100.0%"
                     ])
                 
-                # Fila de totales
-                total_pagos = sum(e[1] for e in estadisticas)
-                estadisticas_data.append([
-                    "TOTAL",
-                    str(total_pagos),
-                    f"S/. {total_cobrado_hoy:.2f}",
-                    "100.0%"
-                ])
-                
-                tabla_estadisticas = Table(estadisticas_data, colWidths=[150, 80, 120, 80])
-                tabla_estadisticas.setStyle(TableStyle([
-                    # Encabezado
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f4788')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+                    tabla_estadisticas = Table(estadisticas_data, colWidths=[150, 80, 120, 80])
+                    tabla_estadisticas.setStyle(TableStyle([
+                        # Encabezado
+                        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1f4788')),
+                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                        ('FONTSIZE', (0, 0), (-1, 0), 10),
+                        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
                     
-                    # Contenido
-                    ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
-                    ('FONTSIZE', (0, 1), (-1, -2), 9),
-                    ('ALIGN', (1, 1), (-1, -1), 'CENTER'),
-                    ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
+                        # Contenido
+                        ('FONTNAME', (0, 1), (-1, -2), 'Helvetica'),
+                        ('FONTSIZE', (0, 1), (-1, -2), 9),
+                        ('ALIGN', (1, 1), (-1, -1), 'CENTER'),
+                        ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
                     
-                    # Fila de totales
-                    ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-                    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, -1), (-1, -1), 10),
+                        # Fila de totales
+                        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+                        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+                        ('FONTSIZE', (0, -1), (-1, -1), 10),
                     
-                    # Bordes
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                    ('BOX', (0, 0), (-1, -1), 1, colors.black),
-                ]))
+                        # Bordes
+                        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+                        ('BOX', (0, 0), (-1, -1), 1, colors.black),
+                    ]))
                 
-                elementos.append(tabla_estadisticas)
-                elementos.append(Spacer(1, 25))
+                    elementos.append(tabla_estadisticas)
+                    elementos.append(Spacer(1, 25))
 
-            # DETALLE DE VENTAS
-            elementos.append(Paragraph("<b>DETALLE DE VENTAS PENDIENTES</b>", estilos["Heading3"]))
-            elementos.append(Spacer(1, 10))
-
-            data = [["Fecha", "Cliente", "Producto", "Total", "Pagado", "Saldo", "Estado", "Método", "Entrega"]]
-            for v in ventas:
-                data.append([
-                    v["Fecha"].strftime('%d/%m/%Y %H:%M'), 
-                    v["Cliente"], 
-                    v["Producto"],
-                    f"S/. {v['Total']:.2f}", 
-                    f"S/. {v['Pagado']:.2f}", 
-                    f"S/. {v['Saldo']:.2f}",
-                    v["Estado"], 
-                    v["Método de pago"], 
-                    v["Entrega"]
-                ])
-
-            tabla = Table(data, repeatRows=1)
-            tabla.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 8),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                ('FONTSIZE', (0, 1), (-1, -1), 7),
-                ('ALIGN', (3, 1), (5, -1), 'RIGHT'),
-            ]))
+                # DETALLE DE VENTAS
+                elementos.append(Paragraph("<b>DETALLE DE VENTAS PENDIENTES</b>", estilos["Heading3"]))
+                elementos.append(Spacer(1, 10))
 
-            elementos.append(tabla)
-            
-            # PIE DE PÁGINA
-            elementos.append(Spacer(1, 20))
-            elementos.append(Paragraph(
-                f"<i>Reporte generado automáticamente por Sistema Comercial NSJ CAPROYECT</i>",
-                estilos["Normal"]
-            ))
-
-            doc.build(elementos)
-            buffer.seek(0)
-
-            st.download_button(
-                "📥 Descargar Reporte Completo", 
-                buffer, 
-                f"reporte_ventas_{hora_peru().strftime('%Y%m%d_%H%M%S')}.pdf", 
-                "application/pdf",
-                use_container_width=True
-            )
+                data = [["Fecha", "Cliente", "Producto", "Total", "Pagado", "Saldo", "Estado", "Método", "Entrega"]]
+                for v in ventas:
+                    data.append([
+                        v["Fecha"].strftime('%d/%m/%Y %H:%M'), 
+                        v["Cliente"], 
+                        v["Producto"],
+                        f"S/. {v['Total']:.2f}", 
+                        f"S/. {v['Pagado']:.2f}", 
+                        f"S/. {v['Saldo']:.2f}",
+                        v["Estado"], 
+                        v["Método de pago"], 
+                        v["Entrega"]
+                    ])
 
-    st.divider()
-    st.subheader("🔒 Cierre de Caja")
+                tabla = Table(data, repeatRows=1)
+                tabla.setStyle(TableStyle([
+                    ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                    ('FONTSIZE', (0, 0), (-1, 0), 8),
+                    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+                
+                    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+                    ('FONTSIZE', (0, 1), (-1, -1), 7),
+                    ('ALIGN', (3, 1), (5, -1), 'RIGHT'),
+                ]))
 
-    if st.button("Realizar Cierre de Caja"):
-        resultado = cierre_de_caja("Admin")
-        if resultado:
-            st.success("✅ Cierre realizado correctamente")
-            st.rerun()
-        else:
-            st.warning("No hay ventas entregadas y pagadas para cerrar")
+                elementos.append(tabla)
+            
+                # PIE DE PÁGINA
+                elementos.append(Spacer(1, 20))
+                elementos.append(Paragraph(
+                    f"<i>Reporte generado automáticamente por Sistema Comercial NSJ CAPROYECT</i>",
+                    estilos["Normal"]
+                ))
+
+                with metricas.medir_operacion("reporte_pdf"), perfilador.seccion("ReportLab"):
+                    doc.build(elementos)
+                buffer.seek(0)
+
+                st.download_button(
+                    "📥 Descargar Reporte Completo", 
+                    buffer, 
+                    f"reporte_ventas_{hora_peru().strftime('%Y%m%d_%H%M%S')}.pdf", 
+                    "application/pdf",
+                    use_container_width=True
+                )
+
+        st.divider()
+        st.subheader("🔒 Cierre de Caja")
+
+        if st.button("Realizar Cierre de Caja"):
+            resultado = cierre_de_caja("Admin")
+            if resultado:
+                st.success("✅ Cierre realizado correctamente")
+                st.rerun()
+            else:
+                st.warning("No hay ventas entregadas y pagadas para cerrar")
+
+        st.divider()
+        st.subheader("📜 Historial de Cierres")
+
+        cierres = leer_panel("cierres", obtener_cierres)
+        if cierres:
+            for c in cierres:
+                with st.container(border=True):
+                    st.write(f"📅 Fecha: {c[0]}")
+                    st.write(f"💰 Total General: S/. {c[1]:.2f}")
+                    st.write(f"Efectivo: S/. {c[2]:.2f} | Yape: S/. {c[3]:.2f} | Plin: S/. {c[4]:.2f} | Transferencia: S/. {c[5]:.2f}")
+                    st.write(f"👤 Usuario: {c[6]} | 🕒 Registrado: {c[7]}")
+        elif cierres == []:
+            st.info("No hay cierres registrados aún.")
+finally:
+    # También las que terminan en st.rerun(), en una excepción o por el auto-refresh
+    ejecucion_completa = False
+    metricas.RERUN_SEGUNDOS.observe(time.perf_counter() - inicio_rerun, tipo="completa")
+    # Libera la captura de cProfile aunque la ejecución no llegue al final
+    perfilador.finalizar_ejecucion(interrumpida=sys.exc_info()[0] is not None)
 
-    st.divider()
-    st.subheader("📜 Historial de Cierres")
-
-    cierres = obtener_cierres()
-    if cierres:
-        for c in cierres:
-            with st.container(border=True):
-                st.write(f"📅 Fecha: {c[0]}")
-                st.write(f"💰 Total General: S/. {c[1]}")
-                st.write(f"Efectivo: S/. {c[2]} | Yape: S/. {c[3]} | Plin: S/. {c[4]} | Transferencia: S/. {c[5]}")
-                st.write(f"👤 Usuario: {c[6]} | 🕒 Registrado: {c[7]}")
-    else:
-        st.info("No hay cierres registrados aún.")
@@ -1,11 +1,789 @@
-import psycopg2
-import streamlit as st
-
-def conectar():
-    return psycopg2.connect(
-        host=st.secrets["DB_HOST"],
-        database=st.secrets["DB_NAME"],
-        user=st.secrets["DB_USER"],
-        password=st.secrets["DB_PASSWORD"],
-        port=st.secrets["DB_PORT"]
-    )
+"""
+Acceso a datos de la app detrás de una interfaz de repositorio.
+
+RepositorioVentas define las operaciones que usa appy.py (registrar, pagar,
+entregar, eliminar, cerrar caja, listar y totalizar). Hay dos motores:
+
+- RepositorioPostgres: el Postgres remoto de siempre, con pool de conexiones.
+- RepositorioSQLite: una base embebida en modo WAL para locales de una sola
+  caja, sin servidor ni latencia de red.
+
+Este módulo no depende de Streamlit: crear_repositorio() recibe cualquier
+mapeo de configuración (st.secrets, un dict, variables de entorno).
+"""
+import queue
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import metricas
+
+LIMA = ZoneInfo("America/Lima")
+METODOS_PAGO = ["Efectivo", "Yape", "Plin", "Transferencia"]
+
+def _venta_desde_fila(r, fecha):
+    return {
+        "id": r[0], "Fecha": fecha, "Cliente": r[2], "Producto": r[3],
+        "Total": float(r[4]), "Pagado": float(r[5]), "Saldo": float(r[6]),
+        "Estado": r[7], "Método de pago": r[8], "Entrega": r[9]
+    }
+
+def _limites_antiguedad(hoy):
+    # Buckets de cobranza: 0–7, 8–30 y más de 30 días desde la venta
+    return hoy - timedelta(days=7), hoy - timedelta(days=30)
+
+def _totales_por_metodo(pagos_por_metodo):
+    totales_metodo = {m: 0 for m in METODOS_PAGO}
+    total_general = 0
+    for metodo, monto in pagos_por_metodo:
+        monto_float = float(monto)
+        total_general += monto_float
+        if metodo in totales_metodo:
+            totales_metodo[metodo] += monto_float
+    return totales_metodo, total_general
+
+class VentaNoEncontrada(Exception):
+    """La venta ya no existe (otra sesión la eliminó)."""
+
+# --------------------------------
+# INTERFAZ
+# --------------------------------
+class RepositorioVentas(ABC):
+    """Operaciones de datos de la app. `hoy` y `fecha` siempre en hora de Perú."""
+
+    # Errores que vale la pena reintentar en una lectura (conexión caída, base ocupada)
+    errores_transitorios = ()
+
+    @abstractmethod
+    def asegurar_esquema(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def registrar_venta(self, venta, fecha):
+        """Guarda la venta y su pago inicial; devuelve el id."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def completar_pago(self, id_venta, metodo, fecha):
+        """
+        Paga el saldo que la venta tiene en la base y devuelve el monto cobrado
+        (0 si ya estaba pagada). Lanza VentaNoEncontrada si la venta ya no existe.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def marcar_entrega(self, id_venta, estado):
+        raise NotImplementedError
+
+    @abstractmethod
+    def eliminar_venta(self, id_venta):
+        raise NotImplementedError
+
+    @abstractmethod
+    def cierre_de_caja(self, usuario, fecha):
+        """Cierra las ventas entregadas y pagadas; devuelve el total o None si no hay."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def limpiar_dia(self, hoy):
+        """Borra ventas y pagos del día; devuelve (ventas_eliminadas, pagos_eliminados)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def listar_ventas(self, hoy=None, alcance="todas"):
+        """Ventas no cerradas: alcance 'todas', 'hoy' o 'anteriores' (a `hoy`)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def totales_del_dia(self, hoy):
+        """Devuelve (total_vendido, total_cobrado, total_pendiente) del día."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def pagos_por_metodo(self, hoy):
+        """Devuelve [(metodo, cantidad, total)] del día, de mayor a menor total."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def total_cobrado(self, hoy):
+        raise NotImplementedError
+
+    @abstractmethod
+    def obtener_cierres(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    def cuentas_por_cobrar(self, hoy):
+        """Devuelve [(cliente, d0_7, d8_30, d30_mas, total, fecha_mas_antigua)]."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def detalle_cuenta(self, cliente):
+        """Devuelve [(fecha, saldo)] pendientes del cliente, del más antiguo al más nuevo."""
+        raise NotImplementedError
+
+# --------------------------------
+# POSTGRES
+# --------------------------------
+class RepositorioPostgres(RepositorioVentas):
+    def __init__(self, host, database, user, password, port, minconn=1, maxconn=5,
+                 connect_timeout=5, statement_timeout=10):
+        import psycopg2
+        import psycopg2.pool
+
+        self._errores_pool = psycopg2.pool.PoolError
+        # QueryCanceled (statement_timeout) es un OperationalError: también se reintenta
+        self._errores_conexion = (psycopg2.OperationalError, psycopg2.InterfaceError)
+        self.errores_transitorios = self._errores_conexion + (psycopg2.pool.PoolError,)
+        # Una base que no responde debe fallar rápido hacia los reintentos y el
+        # circuito, no dejar el rerun colgado en el connect o en una consulta
+        self.pool = psycopg2.pool.SimpleConnectionPool(
+            minconn, maxconn,
+            host=host, database=database, user=user, password=password, port=port,
+            connect_timeout=int(connect_timeout),
+            keepalives=1, keepalives_idle=30, keepalives_interval=10, keepalives_count=3,
+            options=f"-c statement_timeout={int(float(statement_timeout) * 1000)}"
+        )
+        metricas.registrar_pool(self.pool)
+
+    def conectar(self):
+        inicio = time.perf_counter()
+        try:
+            return self.pool.getconn()
+        except self._errores_pool:
+            metricas.POOL_AGOTADO.inc()
+            raise
+        finally:
+            metricas.POOL_ESPERA_SEGUNDOS.observe(time.perf_counter() - inicio)
+
+    def liberar_conexion(self, conn, descartar=False):
+        # Una conexión rota no vuelve al pool: se cierra y el pool abre otra cuando haga falta
+        self.pool.putconn(conn, close=descartar or bool(conn.closed))
+
+    @contextmanager
+    def _cursor(self):
+        conn = self.conectar()
+        descartar = False
+        try:
+            yield conn.cursor()
+            conn.commit()
+        except self._errores_conexion:
+            descartar = True
+            raise
+        finally:
+            self.liberar_conexion(conn, descartar)
+
+    def _ajustar_cuenta_por_cobrar(self, cur, cliente, fecha, monto):
+        """Suma `monto` (negativo para descontar) al saldo del cliente en ese día."""
+        if not monto:
+            return
+        cur.execute("""
+            INSERT INTO cuentas_por_cobrar (cliente, fecha, saldo)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (cliente, fecha)
+            DO UPDATE SET saldo = cuentas_por_cobrar.saldo + EXCLUDED.saldo
+        """, (cliente, fecha, monto))
+        cur.execute("""
+            DELETE FROM cuentas_por_cobrar
+            WHERE cliente = %s AND fecha = %s AND saldo <= 0
+        """, (cliente, fecha))
+
+    def asegurar_esquema(self):
+        # ventas, pagos y cierres_caja ya existen en la base remota
+        with self._cursor() as cur:
+            cur.execute("SELECT to_regclass('cuentas_por_cobrar')")
+            if cur.fetchone()[0] is None:
+                cur.execute("""
+                    CREATE TABLE cuentas_por_cobrar (
+                        cliente TEXT NOT NULL,
+                        fecha DATE NOT NULL,
+                        saldo NUMERIC(12, 2) NOT NULL,
+                        PRIMARY KEY (cliente, fecha)
+                    )
+                """)
+                # Carga inicial desde las ventas que ya tienen saldo
+                cur.execute("""
+                    INSERT INTO cuentas_por_cobrar (cliente, fecha, saldo)
+                    SELECT cliente, DATE(fecha AT TIME ZONE 'America/Lima'), SUM(saldo)
+                    FROM ventas
+                    WHERE saldo > 0
+                    GROUP BY cliente, DATE(fecha AT TIME ZONE 'America/Lima')
+                """)
+
+    def registrar_venta(self, venta, fecha):
+        with self._cursor() as cur:
+            cur.execute("""
+                INSERT INTO ventas
+                (cliente, producto, total, pagado, saldo, estado, metodo_pago, entrega, fecha)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                RETURNING id
+            """, (
+                venta["Cliente"], venta["Producto"], venta["Total"],
+                venta["Pagado"], venta["Saldo"], venta["Estado"],
+                venta["Método de pago"], venta["Entrega"], fecha
+            ))
+            venta_id = cur.fetchone()[0]
+
+            if venta["Pagado"] > 0:
+                cur.execute("""
+                    INSERT INTO pagos (venta_id, fecha, monto, metodo)
+                    VALUES (%s, %s, %s, %s)
+                """, (venta_id, fecha, venta["Pagado"], venta["Método de pago"]))
+
+            # Un adelanto mayor al total deja saldo negativo: no es deuda del cliente
+            self._ajustar_cuenta_por_cobrar(cur, venta["Cliente"], fecha.date(), max(venta["Saldo"], 0))
+        return venta_id
+
+    def completar_pago(self, id_venta, metodo, fecha):
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT cliente, DATE(fecha AT TIME ZONE 'America/Lima'), saldo
+                FROM ventas WHERE id = %s
+                FOR UPDATE
+            """, (id_venta,))
+            fila = cur.fetchone()
+            if fila is None:
+                raise VentaNoEncontrada(id_venta)
+            # El monto sale de la fila bloqueada, no de lo que mostraba la pantalla
+            cliente, fecha_venta, monto = fila
+            if monto <= 0:
+                return 0.0
+
+            cur.execute("""
+                INSERT INTO pagos (venta_id, fecha, monto, metodo)
+                VALUES (%s, %s, %s, %s)
+            """, (id_venta, fecha, monto, metodo))
+
+            cur.execute("""
+                UPDATE ventas
+                SET pagado = pagado + %s, saldo = 0, estado = 'Pagado'
+                WHERE id = %s
+            """, (monto, id_venta))
+
+            self._ajustar_cuenta_por_cobrar(cur, cliente, fecha_venta, -monto)
+        return float(monto)
+
+    def marcar_entrega(self, id_venta, estado):
+        with self._cursor() as cur:
+            cur.execute("UPDATE ventas SET entrega=%s WHERE id=%s", (estado, id_venta))
+
+    def eliminar_venta(self, id_venta):
+        with self._cursor() as cur:
+            cur.execute("DELETE FROM pagos WHERE venta_id=%s", (id_venta,))
+            cur.execute("""
+                DELETE FROM ventas WHERE id=%s
+                RETURNING cliente, DATE(fecha AT TIME ZONE 'America/Lima'), saldo
+            """, (id_venta,))
+            eliminada = cur.fetchone()
+            if eliminada:
+                cliente, fecha_venta, saldo = eliminada
+                self._ajustar_cuenta_por_cobrar(cur, cliente, fecha_venta, -max(saldo, 0))
+
+    def cierre_de_caja(self, usuario, fecha):
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT id FROM ventas
+                WHERE cerrado = FALSE AND entrega = 'Entregado' AND saldo = 0
+            """)
+            ids = [v[0] for v in cur.fetchall()]
+            if not ids:
+                return None
+
+            cur.execute("""
+                SELECT p.metodo, COALESCE(SUM(p.monto), 0) as total
+                FROM pagos p
+                WHERE p.venta_id = ANY(%s)
+                GROUP BY p.metodo
+            """, (ids,))
+            totales_metodo, total_general = _totales_por_metodo(cur.fetchall())
+
+            cur.execute("""
+                INSERT INTO cierres_caja
+                (fecha, total_general, total_efectivo, total_yape, total_plin, total_transferencia, usuario)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, (
+                fecha.date(), total_general,
+                totales_metodo["Efectivo"], totales_metodo["Yape"],
+                totales_metodo["Plin"], totales_metodo["Transferencia"],
+                usuario
+            ))
+
+            cur.execute("UPDATE ventas SET cerrado = TRUE WHERE id = ANY(%s)", (ids,))
+        return total_general
+
+    def limpiar_dia(self, hoy):
+        with self._cursor() as cur:
+            cur.execute("""
+                DELETE FROM pagos
+                WHERE DATE(fecha AT TIME ZONE 'America/Lima') = %s
+            """, (hoy,))
+            pagos_eliminados = cur.rowcount
+
+            cur.execute("""
+                DELETE FROM ventas
+                WHERE DATE(fecha AT TIME ZONE 'America/Lima') = %s
+            """, (hoy,))
+            ventas_eliminadas = cur.rowcount
+
+            # Sus saldos salen también de cuentas por cobrar
+            cur.execute("DELETE FROM cuentas_por_cobrar WHERE fecha = %s", (hoy,))
+        return ventas_eliminadas, pagos_eliminados
+
+    def listar_ventas(self, hoy=None, alcance="todas"):
+        filtro = {
+            "todas": "",
+            "hoy": "AND DATE(fecha AT TIME ZONE 'America/Lima') = %s",
+            "anteriores": "AND DATE(fecha AT TIME ZONE 'America/Lima') < %s",
+        }[alcance]
+        with self._cursor() as cur:
+            cur.execute(f"""
+                SELECT id, fecha, cliente, producto, total, pagado, saldo, estado, metodo_pago, entrega
+                FROM ventas
+                WHERE cerrado = FALSE
+                {filtro}
+                ORDER BY fecha DESC
+            """, (hoy,) if filtro else None)
+            rows = cur.fetchall()
+        return [_venta_desde_fila(r, r[1].astimezone(LIMA)) for r in rows]
+
+    def totales_del_dia(self, hoy):
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT
+                    (SELECT COALESCE(SUM(total),0) FROM ventas
+                     WHERE DATE(fecha AT TIME ZONE 'America/Lima') = %(hoy)s) as total_vendido,
+                    (SELECT COALESCE(SUM(monto),0) FROM pagos
+                     WHERE DATE(fecha AT TIME ZONE 'America/Lima') = %(hoy)s) as total_cobrado,
+                    (SELECT COALESCE(SUM(saldo),0) FROM ventas
+                     WHERE DATE(fecha AT TIME ZONE 'America/Lima') = %(hoy)s) as total_pendiente
+            """, {"hoy": hoy})
+            totales = cur.fetchone()
+        return tuple(float(t) for t in totales)
+
+    def pagos_por_metodo(self, hoy):
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT metodo, COUNT(*), COALESCE(SUM(monto),0)
+                FROM pagos
+                WHERE DATE(fecha AT TIME ZONE 'America/Lima') = %s
+                GROUP BY metodo
+                ORDER BY SUM(monto) DESC
+            """, (hoy,))
+            rows = cur.fetchall()
+        return [(metodo, cantidad, float(total)) for metodo, cantidad, total in rows]
+
+    def total_cobrado(self, hoy):
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT COALESCE(SUM(monto),0)
+                FROM pagos
+                WHERE DATE(fecha AT TIME ZONE 'America/Lima') = %s
+            """, (hoy,))
+            return float(cur.fetchone()[0])
+
+    def obtener_cierres(self):
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT fecha, total_general, total_efectivo, total_yape, total_plin,
+                       total_transferencia, usuario, created_at
+                FROM cierres_caja
+                ORDER BY created_at DESC
+            """)
+            rows = cur.fetchall()
+        return [(r[0], *(float(t) for t in r[1:6]), r[6], r[7]) for r in rows]
+
+    def cuentas_por_cobrar(self, hoy):
+        limite_7, limite_30 = _limites_antiguedad(hoy)
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT cliente,
+                       COALESCE(SUM(saldo) FILTER (WHERE fecha >= %(limite_7)s), 0) AS d0_7,
+                       COALESCE(SUM(saldo) FILTER (WHERE fecha < %(limite_7)s AND fecha >= %(limite_30)s), 0) AS d8_30,
+                       COALESCE(SUM(saldo) FILTER (WHERE fecha < %(limite_30)s), 0) AS d30_mas,
+                       SUM(saldo) AS total,
+                       MIN(fecha) AS mas_antigua
+                FROM cuentas_por_cobrar
+                GROUP BY cliente
+                ORDER BY total DESC
+            """, {"limite_7": limite_7, "limite_30": limite_30})
+            rows = cur.fetchall()
+        return [(r[0], float(r[1]), float(r[2]), float(r[3]), float(r[4]), r[5]) for r in rows]
+
+    def detalle_cuenta(self, cliente):
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT fecha, saldo FROM cuentas_por_cobrar
+                WHERE cliente = %s
+                ORDER BY fecha
+            """, (cliente,))
+            rows = cur.fetchall()
+        return [(fecha, float(saldo)) for fecha, saldo in rows]
+
+# --------------------------------
+# SQLITE (MODO LOCAL)
+# --------------------------------
+ESQUEMA_SQLITE = """
+CREATE TABLE IF NOT EXISTS ventas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha TEXT NOT NULL,
+    cliente TEXT,
+    producto TEXT,
+    total REAL NOT NULL DEFAULT 0,
+    pagado REAL NOT NULL DEFAULT 0,
+    saldo REAL NOT NULL DEFAULT 0,
+    estado TEXT,
+    metodo_pago TEXT,
+    entrega TEXT,
+    cerrado INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_ventas_cerrado_fecha ON ventas (cerrado, fecha);
+CREATE INDEX IF NOT EXISTS idx_ventas_fecha ON ventas (fecha);
+
+CREATE TABLE IF NOT EXISTS pagos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    venta_id INTEGER NOT NULL REFERENCES ventas (id),
+    fecha TEXT NOT NULL,
+    monto REAL NOT NULL,
+    metodo TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_pagos_venta ON pagos (venta_id);
+CREATE INDEX IF NOT EXISTS idx_pagos_fecha ON pagos (fecha);
+
+CREATE TABLE IF NOT EXISTS cierres_caja (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    fecha TEXT NOT NULL,
+    total_general REAL NOT NULL,
+    total_efectivo REAL NOT NULL,
+    total_yape REAL NOT NULL,
+    total_plin REAL NOT NULL,
+    total_transferencia REAL NOT NULL,
+    usuario TEXT,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS cuentas_por_cobrar (
+    cliente TEXT NOT NULL,
+    fecha TEXT NOT NULL,
+    saldo REAL NOT NULL,
+    PRIMARY KEY (cliente, fecha)
+) WITHOUT ROWID;
+"""
+
+class BaseOcupada(sqlite3.OperationalError):
+    """Otra conexión tiene el lock de la base (SQLITE_BUSY / SQLITE_LOCKED)."""
+
+def _es_base_ocupada(error):
+    # sqlite_errorname existe desde Python 3.11; antes solo queda el mensaje
+    nombre = getattr(error, "sqlite_errorname", None)
+    if nombre is not None:
+        return nombre.startswith(("SQLITE_BUSY", "SQLITE_LOCKED"))
+    mensaje = str(error)
+    return "locked" in mensaje or "busy" in mensaje
+
+class RepositorioSQLite(RepositorioVentas):
+    """
+    Base embebida en un archivo. Las fechas se guardan como texto ISO en hora
+    de Perú, así el día de una venta es simplemente substr(fecha, 1, 10).
+    """
+
+    # Solo "database is locked"; el resto de OperationalError (tabla que no
+    # existe, disco lleno, archivo ilegible) no se arregla reintentando
+    errores_transitorios = (BaseOcupada,)
+
+    def __init__(self, ruta, maxconn=5):
+        self.ruta = ruta
+        self.maxconn = maxconn
+        self._libres = queue.LifoQueue()
+
+    def _nueva_conexion(self):
+        # isolation_level=None: las transacciones se abren a mano con BEGIN IMMEDIATE
+        conn = sqlite3.connect(self.ruta, isolation_level=None, check_same_thread=False, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Con WAL, NORMAL no arriesga corrupción y evita un fsync por commit
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def conectar(self):
+        try:
+            return self._libres.get_nowait()
+        except queue.Empty:
+            return self._nueva_conexion()
+
+    def liberar_conexion(self, conn):
+        if self._libres.qsize() < self.maxconn:
+            self._libres.put(conn)
+        else:
+            conn.close()
+
+    @contextmanager
+    def _cursor(self, escritura=False):
+        try:
+            conn = self.conectar()
+            try:
+                cur = conn.cursor()
+                if escritura:
+                    # Toma el lock de escritura al inicio y evita SQLITE_BUSY al promover
+                    cur.execute("BEGIN IMMEDIATE")
+                try:
+                    yield cur
+                except BaseException:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    raise
+                if conn.in_transaction:
+                    conn.commit()
+            finally:
+                self.liberar_conexion(conn)
+        except sqlite3.OperationalError as e:
+            if isinstance(e, BaseOcupada) or not _es_base_ocupada(e):
+                raise
+            raise BaseOcupada(*e.args) from e
+
+    def _ajustar_cuenta_por_cobrar(self, cur, cliente, fecha, monto):
+        """Suma `monto` (negativo para descontar) al saldo del cliente en ese día."""
+        if not monto:
+            return
+        cur.execute("""
+            INSERT INTO cuentas_por_cobrar (cliente, fecha, saldo)
+            VALUES (?, ?, ?)
+            ON CONFLICT (cliente, fecha)
+            DO UPDATE SET saldo = ROUND(cuentas_por_cobrar.saldo + excluded.saldo, 2)
+        """, (cliente, str(fecha), monto))
+        cur.execute("""
+            DELETE FROM cuentas_por_cobrar
+            WHERE cliente = ? AND fecha = ? AND saldo <= 0
+        """, (cliente, str(fecha)))
+
+    def asegurar_esquema(self):
+        conn = self.conectar()
+        try:
+            conn.executescript(ESQUEMA_SQLITE)
+        finally:
+            self.liberar_conexion(conn)
+
+    def registrar_venta(self, venta, fecha):
+        fecha_texto = fecha.isoformat()
+        with self._cursor(escritura=True) as cur:
+            cur.execute("""
+                INSERT INTO ventas
+                (cliente, producto, total, pagado, saldo, estado, metodo_pago, entrega, fecha)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                venta["Cliente"], venta["Producto"], venta["Total"],
+                venta["Pagado"], venta["Saldo"], venta["Estado"],
+                venta["Método de pago"], venta["Entrega"], fecha_texto
+            ))
+            venta_id = cur.lastrowid
+
+            if venta["Pagado"] > 0:
+                cur.execute("""
+                    INSERT INTO pagos (venta_id, fecha, monto, metodo)
+                    VALUES (?, ?, ?, ?)
+                """, (venta_id, fecha_texto, venta["Pagado"], venta["Método de pago"]))
+
+            # Un adelanto mayor al total deja saldo negativo: no es deuda del cliente
+            self._ajustar_cuenta_por_cobrar(cur, venta["Cliente"], fecha.date(), max(venta["Saldo"], 0))
+        return venta_id
+
+    def completar_pago(self, id_venta, metodo, fecha):
+        with self._cursor(escritura=True) as cur:
+            cur.execute("SELECT cliente, substr(fecha, 1, 10), saldo FROM ventas WHERE id = ?", (id_venta,))
+            fila = cur.fetchone()
+            if fila is None:
+                raise VentaNoEncontrada(id_venta)
+            cliente, fecha_venta, monto = fila
+            if monto <= 0:
+                return 0.0
+
+            cur.execute("""
+                INSERT INTO pagos (venta_id, fecha, monto, metodo)
+                VALUES (?, ?, ?, ?)
+            """, (id_venta, fecha.isoformat(), monto, metodo))
+
+            cur.execute("""
+                UPDATE ventas
+                SET pagado = pagado + ?, saldo = 0, estado = 'Pagado'
+                WHERE id = ?
+            """, (monto, id_venta))
+
+            self._ajustar_cuenta_por_cobrar(cur, cliente, fecha_venta, -monto)
+        return float(monto)
+
+    def marcar_entrega(self, id_venta, estado):
+        with self._cursor(escritura=True) as cur:
+            cur.execute("UPDATE ventas SET entrega=? WHERE id=?", (estado, id_venta))
+
+    def eliminar_venta(self, id_venta):
+        with self._cursor(escritura=True) as cur:
+            cur.execute("SELECT cliente, substr(fecha, 1, 10), saldo FROM ventas WHERE id = ?", (id_venta,))
+            eliminada = cur.fetchone()
+            cur.execute("DELETE FROM pagos WHERE venta_id=?", (id_venta,))
+            cur.execute("DELETE FROM ventas WHERE id=?", (id_venta,))
+            if eliminada:
+                cliente, fecha_venta, saldo = eliminada
+                self._ajustar_cuenta_por_cobrar(cur, cliente, fecha_venta, -max(saldo, 0))
+
+    def cierre_de_caja(self, usuario, fecha):
+        with self._cursor(escritura=True) as cur:
+            cur.execute("""
+                SELECT id FROM ventas
+                WHERE cerrado = 0 AND entrega = 'Entregado' AND saldo = 0
+            """)
+            ids = [v[0] for v in cur.fetchall()]
+            if not ids:
+                return None
+
+            marcadores = ",".join("?" * len(ids))
+            cur.execute(f"""
+                SELECT metodo, COALESCE(SUM(monto), 0) as total
+                FROM pagos
+                WHERE venta_id IN ({marcadores})
+                GROUP BY metodo
+            """, ids)
+            totales_metodo, total_general = _totales_por_metodo(cur.fetchall())
+
+            cur.execute("""
+                INSERT INTO cierres_caja
+                (fecha, total_general, total_efectivo, total_yape, total_plin, total_transferencia, usuario, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                fecha.date().isoformat(), total_general,
+                totales_metodo["Efectivo"], totales_metodo["Yape"],
+                totales_metodo["Plin"], totales_metodo["Transferencia"],
+                usuario, fecha.isoformat()
+            ))
+
+            cur.execute(f"UPDATE ventas SET cerrado = 1 WHERE id IN ({marcadores})", ids)
+        return total_general
+
+    def limpiar_dia(self, hoy):
+        dia = hoy.isoformat()
+        with self._cursor(escritura=True) as cur:
+            cur.execute("DELETE FROM pagos WHERE substr(fecha, 1, 10) = ?", (dia,))
+            pagos_eliminados = cur.rowcount
+            cur.execute("DELETE FROM ventas WHERE substr(fecha, 1, 10) = ?", (dia,))
+            ventas_eliminadas = cur.rowcount
+            cur.execute("DELETE FROM cuentas_por_cobrar WHERE fecha = ?", (dia,))
+        return ventas_eliminadas, pagos_eliminados
+
+    def listar_ventas(self, hoy=None, alcance="todas"):
+        filtro = {
+            "todas": "",
+            "hoy": "AND substr(fecha, 1, 10) = ?",
+            "anteriores": "AND substr(fecha, 1, 10) < ?",
+        }[alcance]
+        with self._cursor() as cur:
+            cur.execute(f"""
+                SELECT id, fecha, cliente, producto, total, pagado, saldo, estado, metodo_pago, entrega
+                FROM ventas
+                WHERE cerrado = 0
+                {filtro}
+                ORDER BY fecha DESC
+            """, (hoy.isoformat(),) if filtro else ())
+            rows = cur.fetchall()
+        return [_venta_desde_fila(r, datetime.fromisoformat(r[1]).astimezone(LIMA)) for r in rows]
+
+    def totales_del_dia(self, hoy):
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT
+                    (SELECT COALESCE(SUM(total),0) FROM ventas WHERE substr(fecha, 1, 10) = :hoy),
+                    (SELECT COALESCE(SUM(monto),0) FROM pagos WHERE substr(fecha, 1, 10) = :hoy),
+                    (SELECT COALESCE(SUM(saldo),0) FROM ventas WHERE substr(fecha, 1, 10) = :hoy)
+            """, {"hoy": hoy.isoformat()})
+            totales = cur.fetchone()
+        return tuple(float(t) for t in totales)
+
+    def pagos_por_metodo(self, hoy):
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT metodo, COUNT(*), COALESCE(SUM(monto),0)
+                FROM pagos
+                WHERE substr(fecha, 1, 10) = ?
+                GROUP BY metodo
+                ORDER BY SUM(monto) DESC
+            """, (hoy.isoformat(),))
+            rows = cur.fetchall()
+        return [(metodo, cantidad, float(total)) for metodo, cantidad, total in rows]
+
+    def total_cobrado(self, hoy):
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT COALESCE(SUM(monto),0)
+                FROM pagos
+                WHERE substr(fecha, 1, 10) = ?
+            """, (hoy.isoformat(),))
+            return float(cur.fetchone()[0])
+
+    def obtener_cierres(self):
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT fecha, total_general, total_efectivo, total_yape, total_plin,
+                       total_transferencia, usuario, created_at
+                FROM cierres_caja
+                ORDER BY created_at DESC
+            """)
+            rows = cur.fetchall()
+        return [
+            (date.fromisoformat(r[0]), *(float(t) for t in r[1:6]), r[6], datetime.fromisoformat(r[7]))
+            for r in rows
+        ]
+
+    def cuentas_por_cobrar(self, hoy):
+        limite_7, limite_30 = _limites_antiguedad(hoy)
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT cliente,
+                       COALESCE(SUM(saldo) FILTER (WHERE fecha >= :limite_7), 0) AS d0_7,
+                       COALESCE(SUM(saldo) FILTER (WHERE fecha < :limite_7 AND fecha >= :limite_30), 0) AS d8_30,
+                       COALESCE(SUM(saldo) FILTER (WHERE fecha < :limite_30), 0) AS d30_mas,
+                       SUM(saldo) AS total,
+                       MIN(fecha) AS mas_antigua
+                FROM cuentas_por_cobrar
+                GROUP BY cliente
+                ORDER BY total DESC
+            """, {"limite_7": limite_7.isoformat(), "limite_30": limite_30.isoformat()})
+            rows = cur.fetchall()
+        return [
+            (r[0], float(r[1]), float(r[2]), float(r[3]), float(r[4]), date.fromisoformat(r[5]))
+            for r in rows
+        ]
+
+    def detalle_cuenta(self, cliente):
+        with self._cursor() as cur:
+            cur.execute("""
+                SELECT fecha, saldo FROM cuentas_por_cobrar
+                WHERE cliente = ?
+                ORDER BY fecha
+            """, (cliente,))
+            rows = cur.fetchall()
+        return [(date.fromisoformat(fecha), float(saldo)) for fecha, saldo in rows]
+
+# --------------------------------
+# SELECCIÓN DE MOTOR
+# --------------------------------
+def crear_repositorio(config):
+    """
+    Crea el repositorio según `config` (st.secrets u otro mapeo):
+    DB_BACKEND = "postgres" (por defecto) usa DB_HOST, DB_NAME, DB_USER,
+    DB_PASSWORD y DB_PORT, y opcionalmente DB_CONNECT_TIMEOUT y
+    DB_STATEMENT_TIMEOUT en segundos; DB_BACKEND = "sqlite" usa SQLITE_PATH.
+    """
+    motor = str(config.get("DB_BACKEND", "postgres")).lower()
+    if motor == "sqlite":
+        return RepositorioSQLite(config.get("SQLITE_PATH", "ventas.db"))
+    if motor == "postgres":
+        return RepositorioPostgres(
+            host=config["DB_HOST"],
+            database=config["DB_NAME"],
+            user=config["DB_USER"],
+            password=config["DB_PASSWORD"],
+            port=config["DB_PORT"],
+            connect_timeout=config.get("DB_CONNECT_TIMEOUT", 5),
+            statement_timeout=config.get("DB_STATEMENT_TIMEOUT", 10)
+        )
+    raise ValueError(f"DB_BACKEND desconocido: {motor}")
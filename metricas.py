@@ -0,0 +1,286 @@
+"""
+Métricas del proceso en formato de texto de Prometheus.
+
+Los contadores e histogramas guardan sus valores en un fragmento (shard) por
+hilo: cada hilo de Streamlit escribe solo en su propio diccionario, sin locks,
+y el hilo del servidor HTTP suma todos los fragmentos al momento del scrape.
+Así el costo de registrar una métrica es un par de operaciones de diccionario.
+Streamlit suele usar un hilo nuevo por rerun, por eso los fragmentos de hilos
+que ya terminaron se suman a un total base y se descartan.
+"""
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TIPO_CONTENIDO = "text/plain; version=0.0.4; charset=utf-8"
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# --------------------------------
+# TIPOS DE MÉTRICA
+# --------------------------------
+class _Fragmentada(ABC):
+    """Base de las métricas con un fragmento por hilo."""
+
+    tipo = ""
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._local = threading.local()
+        self._fragmentos = []
+        self._base = {}
+        self._lock_registro = threading.Lock()
+
+    def _fragmento(self):
+        try:
+            return self._local.fragmento
+        except AttributeError:
+            fragmento = {}
+            # Solo la primera escritura de cada hilo toma el lock
+            with self._lock_registro:
+                self._recoger_muertos()
+                self._fragmentos.append((threading.current_thread(), fragmento))
+            self._local.fragmento = fragmento
+            return fragmento
+
+    def _recoger_muertos(self):
+        """Suma al total base los fragmentos de hilos terminados. Llamar con el lock tomado."""
+        vivos = []
+        for hilo, fragmento in self._fragmentos:
+            if hilo.is_alive():
+                vivos.append((hilo, fragmento))
+            else:
+                # Un hilo terminado ya no escribe: su fragmento se puede leer sin carrera
+                for clave, valor in fragmento.items():
+                    self._base[clave] = self._acumular(self._base.get(clave), valor)
+        self._fragmentos = vivos
+
+    @abstractmethod
+    def _acumular(self, total, valor):
+        """Suma un valor de fragmento al total base (None si aún no hay)."""
+
+    @abstractmethod
+    def _muestras(self):
+        """Líneas de muestra del texto de exposición, sin HELP ni TYPE."""
+
+    def _clave(self, etiquetas):
+        if set(etiquetas) != set(self.etiquetas):
+            raise ValueError(f"{self.nombre} espera las etiquetas {self.etiquetas}, recibió {tuple(etiquetas)}")
+        return tuple(str(etiquetas[e]) for e in self.etiquetas)
+
+    def _copias(self):
+        with self._lock_registro:
+            self._recoger_muertos()
+            return [self._base.copy()] + [f.copy() for _, f in self._fragmentos]
+
+    def _etiquetas_texto(self, clave, extra=None):
+        pares = list(zip(self.etiquetas, clave))
+        if extra:
+            pares.append(extra)
+        if not pares:
+            return ""
+        cuerpo = ",".join(f'{k}="{_escapar(v)}"' for k, v in pares)
+        return "{" + cuerpo + "}"
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        lineas.extend(self._muestras())
+        return lineas
+
+class Contador(_Fragmentada):
+    tipo = "counter"
+
+    def _acumular(self, total, valor):
+        return (total or 0) + valor
+
+    def inc(self, valor=1, **etiquetas):
+        fragmento = self._fragmento()
+        clave = self._clave(etiquetas)
+        fragmento[clave] = fragmento.get(clave, 0) + valor
+
+    def valor(self, **etiquetas):
+        clave = self._clave(etiquetas)
+        return sum(f.get(clave, 0) for f in self._copias())
+
+    def _muestras(self):
+        totales = {}
+        for fragmento in self._copias():
+            for clave, valor in fragmento.items():
+                totales[clave] = totales.get(clave, 0) + valor
+        if not totales and not self.etiquetas:
+            totales[()] = 0
+        return [f"{self.nombre}{self._etiquetas_texto(c)} {_numero(v)}" for c, v in sorted(totales.items())]
+
+class Histograma(_Fragmentada):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+
+    def _acumular(self, total, valor):
+        if total is None:
+            return list(valor)
+        return [t + v for t, v in zip(total, valor)]
+
+    def observe(self, valor, **etiquetas):
+        fragmento = self._fragmento()
+        clave = self._clave(etiquetas)
+        datos = fragmento.get(clave)
+        if datos is None:
+            # [conteo por bucket..., +Inf, suma]
+            datos = [0] * (len(self.buckets) + 2)
+            fragmento[clave] = datos
+        datos[bisect_left(self.buckets, valor)] += 1
+        datos[-1] += valor
+
+    @contextmanager
+    def medir(self, **etiquetas):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - inicio, **etiquetas)
+
+    def _muestras(self):
+        totales = {}
+        for fragmento in self._copias():
+            for clave, datos in fragmento.items():
+                acumulado = totales.setdefault(clave, [0] * len(datos))
+                for i, v in enumerate(list(datos)):
+                    acumulado[i] += v
+
+        lineas = []
+        for clave, datos in sorted(totales.items()):
+            conteo = 0
+            for limite, n in zip(self.buckets + (float("inf"),), datos):
+                conteo += n
+                le = ("le", "+Inf" if limite == float("inf") else _numero(limite))
+                lineas.append(f"{self.nombre}_bucket{self._etiquetas_texto(clave, le)} {conteo}")
+            lineas.append(f"{self.nombre}_sum{self._etiquetas_texto(clave)} {_numero(datos[-1])}")
+            lineas.append(f"{self.nombre}_count{self._etiquetas_texto(clave)} {conteo}")
+        return lineas
+
+class Medidor:
+    """Gauge calculado al momento del scrape a partir de una función."""
+
+    tipo = "gauge"
+
+    def __init__(self, nombre, ayuda, funcion=None):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.funcion = funcion
+
+    def fijar_funcion(self, funcion):
+        self.funcion = funcion
+
+    def exponer(self):
+        lineas = [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+        if self.funcion is not None:
+            try:
+                lineas.append(f"{self.nombre} {_numero(self.funcion())}")
+            except Exception:
+                pass
+        return lineas
+
+def _numero(valor):
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return repr(valor) if isinstance(valor, float) else str(valor)
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+# --------------------------------
+# REGISTRO
+# --------------------------------
+REGISTRO = []
+
+def _registrar(metrica):
+    REGISTRO.append(metrica)
+    return metrica
+
+def exponer():
+    lineas = []
+    for metrica in REGISTRO:
+        lineas.extend(metrica.exponer())
+    return "\n".join(lineas) + "\n"
+
+# --------------------------------
+# MÉTRICAS DE LA APP
+# --------------------------------
+VENTAS_REGISTRADAS = _registrar(Contador(
+    "nsj_ventas_registradas_total", "Ventas registradas", ("metodo",)))
+MONTO_VENDIDO = _registrar(Contador(
+    "nsj_monto_vendido_soles_total", "Suma del total de las ventas registradas"))
+PAGOS_COMPLETADOS = _registrar(Contador(
+    "nsj_pagos_completados_total", "Pagos de saldo completados", ("metodo",)))
+CIERRES = _registrar(Contador(
+    "nsj_cierres_total", "Cierres de caja realizados"))
+OPERACION_SEGUNDOS = _registrar(Histograma(
+    "nsj_operacion_segundos", "Duración de las operaciones de datos", ("operacion",)))
+OPERACION_ERRORES = _registrar(Contador(
+    "nsj_operacion_errores_total", "Operaciones de datos que terminaron en excepción", ("operacion",)))
+POOL_ESPERA_SEGUNDOS = _registrar(Histograma(
+    "nsj_pool_espera_segundos", "Tiempo para obtener una conexión del pool",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0)))
+POOL_AGOTADO = _registrar(Contador(
+    "nsj_pool_agotado_total", "Pedidos de conexión rechazados por pool agotado"))
+POOL_EN_USO = _registrar(Medidor(
+    "nsj_pool_conexiones_en_uso", "Conexiones del pool prestadas en este momento"))
+POOL_MAXIMO = _registrar(Medidor(
+    "nsj_pool_conexiones_maximo", "Tamaño máximo del pool"))
+RERUN_SEGUNDOS = _registrar(Histograma(
+    "nsj_rerun_segundos", "Duración de las ejecuciones de appy.py, completas o solo de un fragmento", ("tipo",)))
+REINTENTOS = _registrar(Contador(
+    "nsj_lecturas_reintentos_total", "Reintentos de lecturas tras un error transitorio de la base"))
+LECTURAS_OBSOLETAS = _registrar(Contador(
+    "nsj_lecturas_obsoletas_total", "Lecturas servidas desde la última copia buena"))
+CIRCUITO_ABIERTO = _registrar(Medidor(
+    "nsj_circuito_abierto", "1 si el circuito de lecturas está abierto"))
+
+@contextmanager
+def medir_operacion(operacion):
+    """Registra la duración de una operación de datos y cuenta si falla."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        OPERACION_ERRORES.inc(operacion=operacion)
+        raise
+    finally:
+        OPERACION_SEGUNDOS.observe(time.perf_counter() - inicio, operacion=operacion)
+
+def registrar_pool(pool):
+    POOL_EN_USO.fijar_funcion(lambda: len(pool._used))
+    POOL_MAXIMO.fijar_funcion(lambda: pool.maxconn)
+
+# --------------------------------
+# SERVIDOR HTTP
+# --------------------------------
+class _Manejador(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        cuerpo = exponer().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", TIPO_CONTENIDO)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, format, *args):
+        pass
+
+def iniciar_servidor(puerto, host="127.0.0.1"):
+    """Levanta el endpoint /metrics en un hilo de fondo y devuelve el servidor."""
+    servidor = ThreadingHTTPServer((host, int(puerto)), _Manejador)
+    servidor.daemon_threads = True
+    hilo = threading.Thread(target=servidor.serve_forever, name="metricas-http", daemon=True)
+    hilo.start()
+    return servidor
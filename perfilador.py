@@ -0,0 +1,195 @@
+"""
+Perfilado opcional por rerun de appy.py.
+
+Cada sección de la app (sidebar, cada tab y cada @st.fragment) se envuelve en
+un cronómetro; las últimas ejecuciones quedan en la sesión con su desglose.
+Desde el sidebar se puede además capturar un cProfile completo de la próxima
+ejecución y descargarlo como archivo .pstats.
+
+Solo puede haber una captura a la vez en el proceso: desde Python 3.12
+cProfile usa sys.monitoring, que es global, y un segundo enable() falla. Por
+lo mismo, en 3.12+ la captura también ve el trabajo de otras sesiones que
+corran al mismo tiempo.
+"""
+import cProfile
+import io
+import marshal
+import pstats
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from functools import wraps
+
+import streamlit as st
+
+MAX_EJECUCIONES = 20
+_LOCK_CAPTURA = threading.Lock()
+
+class Perfilador:
+    def __init__(self, max_ejecuciones=MAX_EJECUCIONES):
+        self.activo = False
+        self.captura_pendiente = False
+        self.ejecuciones = deque(maxlen=max_ejecuciones)
+        self.captura = None
+        self.aviso = None
+        self._actual = None
+        self._pila = []
+        self._perfil = None
+
+    # --------------------------------
+    # EJECUCIONES
+    # --------------------------------
+    def iniciar_ejecucion(self, tipo="completa"):
+        # Una ejecución abierta es una que no pasó por finalizar_ejecucion(); appy.py
+        # la cierra en un finally, esto solo la cubre si algo se lo saltó
+        if self._actual is not None:
+            self.finalizar_ejecucion(interrumpida=True)
+
+        if self.captura_pendiente:
+            self.captura_pendiente = False
+            self._iniciar_captura()
+
+        if not self.activo and self._perfil is None:
+            return
+        self._actual = {
+            "inicio": datetime.now(ZoneInfo("America/Lima")),
+            "tipo": tipo,
+            "secciones": [],
+            "total": 0.0,
+            "interrumpida": False,
+            "_t0": time.perf_counter(),
+        }
+        self._pila = []
+
+    def _iniciar_captura(self):
+        if not _LOCK_CAPTURA.acquire(blocking=False):
+            self.aviso = "Otra sesión está capturando un cProfile. Intenta de nuevo en unos segundos."
+            return
+        perfil = cProfile.Profile()
+        try:
+            perfil.enable()
+        except ValueError:
+            # Otra herramienta de perfilado ya está activa en el proceso
+            _LOCK_CAPTURA.release()
+            self.aviso = "Hay otro perfilador activo en el proceso; no se pudo capturar."
+            return
+        self._perfil = perfil
+
+    def finalizar_ejecucion(self, interrumpida=False):
+        actual, self._actual = self._actual, None
+        if actual is None:
+            return
+        actual["total"] = time.perf_counter() - actual.pop("_t0")
+        actual["interrumpida"] = interrumpida
+        self.ejecuciones.appendleft(actual)
+
+        if self._perfil is not None:
+            perfil, self._perfil = self._perfil, None
+            try:
+                perfil.disable()
+            finally:
+                _LOCK_CAPTURA.release()
+            self._guardar_captura(perfil, actual)
+
+    def _guardar_captura(self, perfil, ejecucion):
+        perfil.create_stats()
+        # Mismo formato que Profile.dump_stats: se abre con pstats.Stats(archivo).
+        # Se serializa antes de armar el resumen porque pstats.Stats vacía perfil.stats
+        datos = marshal.dumps(perfil.stats)
+        resumen = io.StringIO()
+        pstats.Stats(perfil, stream=resumen).sort_stats("cumulative").print_stats(30)
+        self.captura = {
+            "inicio": ejecucion["inicio"],
+            "total": ejecucion["total"],
+            "interrumpida": ejecucion["interrumpida"],
+            "datos": datos,
+            "resumen": resumen.getvalue(),
+        }
+
+    # --------------------------------
+    # SECCIONES
+    # --------------------------------
+    @contextmanager
+    def _medir(self, nombre):
+        self._pila.append(nombre)
+        nivel = len(self._pila) - 1
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracion = time.perf_counter() - inicio
+            self._pila.pop()
+            if self._actual is not None:
+                self._actual["secciones"].append({"seccion": nombre, "nivel": nivel, "segundos": duracion})
+
+    def seccion(self, nombre):
+        if self._actual is None:
+            return nullcontext()
+        return self._medir(nombre)
+
+    @contextmanager
+    def fragmento(self, nombre):
+        # En un rerun solo del fragmento no pasa por iniciar_ejecucion(): se mide como ejecución propia
+        propia = self._actual is None and self.activo
+        if propia:
+            self.iniciar_ejecucion(tipo="fragmento")
+        try:
+            with self.seccion(nombre):
+                yield
+        finally:
+            if propia:
+                self.finalizar_ejecucion(interrumpida=sys.exc_info()[0] is not None)
+
+    def desglose(self):
+        filas = []
+        for i, e in enumerate(self.ejecuciones):
+            for s in e["secciones"]:
+                filas.append({
+                    "ejecución": i,
+                    "inicio": e["inicio"].strftime("%H:%M:%S"),
+                    "tipo": e["tipo"] + (" (cortada)" if e["interrumpida"] else ""),
+                    "sección": "  " * s["nivel"] + s["seccion"],
+                    "ms": round(s["segundos"] * 1000, 1),
+                })
+            filas.append({
+                "ejecución": i,
+                "inicio": e["inicio"].strftime("%H:%M:%S"),
+                "tipo": e["tipo"] + (" (cortada)" if e["interrumpida"] else ""),
+                "sección": "TOTAL",
+                "ms": round(e["total"] * 1000, 1),
+            })
+        return filas
+
+# --------------------------------
+# ACCESO DESDE LA APP
+# --------------------------------
+def actual():
+    if "perfilador" not in st.session_state:
+        st.session_state.perfilador = Perfilador()
+    return st.session_state.perfilador
+
+def iniciar_ejecucion():
+    # El checkbox del sidebar ya actualizó session_state antes de este rerun
+    perfil = actual()
+    perfil.activo = st.session_state.get("perfilado_activo", False)
+    perfil.iniciar_ejecucion()
+
+def finalizar_ejecucion(interrumpida=False):
+    actual().finalizar_ejecucion(interrumpida)
+
+def seccion(nombre):
+    return actual().seccion(nombre)
+
+def perfilado(nombre):
+    """Decorador para los @st.fragment: va debajo de @st.fragment."""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with actual().fragmento(nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
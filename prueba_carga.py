@@ -0,0 +1,748 @@
+"""
+Prueba de carga para appy.py.
+
+Levanta `streamlit run appy.py` (o usa uno ya levantado con --url) y conecta N
+cajeros simulados por websocket, igual que N pestañas del navegador. Todos
+comparten el proceso del servidor y su único pool de conexiones, así que la
+prueba responde cuántos cajeros aguanta un proceso con su pool antes de que
+las peticiones esperen o fallen. Cada cajero ejecuta una mezcla de acciones de
+caja (registrar venta, completar pago, ver paneles) y se reporta, por cada
+nivel de concurrencia: throughput, latencia de rerun p50/p95/p99, latencia por
+acción, espera y uso del pool, reintentos y tasa de errores. Los datos del
+pool salen del endpoint /metrics de la app.
+
+Con --modo procesos cada cajero corre en su propio proceso con AppTest, con su
+propio Streamlit y su propio pool: esa variante solo mide la contención de la
+base de datos, no la del pool.
+
+Uso:
+    python prueba_carga.py --niveles 1,2,4,8,16 --duracion 30
+    python prueba_carga.py --mezcla venta=0.2,pago=0.2,panel=0.6 --auto-refresh
+    python prueba_carga.py --url http://localhost:8501 --metricas-url http://localhost:9108/metrics
+
+Las credenciales se leen de las variables de entorno DB_HOST, DB_NAME,
+DB_USER, DB_PASSWORD y DB_PORT. La prueba ESCRIBE ventas y pagos reales, por
+eso se niega a correr contra un host que no sea local salvo --permitir-remoto.
+Con --backend sqlite corre sobre un archivo SQLite temporal.
+"""
+import argparse
+import csv
+import json
+import math
+import multiprocessing
+import os
+import queue
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from contextlib import ExitStack, contextmanager
+
+from database import METODOS_PAGO
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "appy.py")
+HOSTS_LOCALES = {"localhost", "127.0.0.1", "::1"}
+INTERVALO_AUTO_REFRESH = 5
+INTERVALO_MUESTREO = 0.5
+
+# --------------------------------
+# MEDICIÓN DEL POOL (MODO PROCESOS)
+# --------------------------------
+class MedidorPool:
+    """Envuelve SimpleConnectionPool.getconn para medir la espera y los agotamientos."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.esperas = []
+        self.agotados = 0
+        self.original = None
+
+    def instalar(self):
+        import psycopg2.pool
+
+        self.original = psycopg2.pool.SimpleConnectionPool.getconn
+        medidor = self
+
+        def getconn(pool, *args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return medidor.original(pool, *args, **kwargs)
+            except psycopg2.pool.PoolError:
+                with medidor.lock:
+                    medidor.agotados += 1
+                raise
+            finally:
+                with medidor.lock:
+                    medidor.esperas.append(time.perf_counter() - inicio)
+
+        psycopg2.pool.SimpleConnectionPool.getconn = getconn
+
+    def desinstalar(self):
+        if self.original is not None:
+            import psycopg2.pool
+
+            psycopg2.pool.SimpleConnectionPool.getconn = self.original
+
+    def reiniciar(self):
+        with self.lock:
+            self.esperas = []
+            self.agotados = 0
+
+    def tomar(self):
+        with self.lock:
+            return list(self.esperas), self.agotados
+
+# --------------------------------
+# CAJERO SIMULADO
+# --------------------------------
+def por_etiqueta(elementos, etiqueta):
+    for e in elementos:
+        if e.label == etiqueta:
+            return e
+    raise LookupError(f"No se encontró el widget '{etiqueta}'")
+
+class Cajero:
+    """
+    Un cajero que ejecuta acciones al azar según la mezcla. Las subclases
+    saben cómo hablar con la app: widget(), fijar(), rerun() y botones_confirmar().
+    """
+
+    def __init__(self, numero, mezcla, timeout, pausa, auto_refresh):
+        self.numero = numero
+        self.rng = random.Random(numero)
+        self.mezcla = mezcla
+        self.timeout = timeout
+        self.pausa = pausa
+        self.auto_refresh = auto_refresh
+        self.reiniciar()
+
+    def ejecutar(self, nombre, accion):
+        inicio = time.perf_counter()
+        try:
+            accion()
+        except Exception as e:
+            self.errores += 1
+            if len(self.mensajes_error) < 5:
+                self.mensajes_error.append(f"{nombre}: {e}")
+        finally:
+            self.latencias.append(time.perf_counter() - inicio)
+            self.acciones[nombre] = self.acciones.get(nombre, 0) + 1
+
+    def reiniciar(self):
+        self.latencias = []
+        self.reruns = []
+        self.acciones = {}
+        self.errores = 0
+        self.mensajes_error = []
+
+    def resultado(self):
+        return {
+            "latencias": self.latencias,
+            "reruns": self.reruns,
+            "acciones": self.acciones,
+            "errores": self.errores,
+            "mensajes_error": self.mensajes_error,
+        }
+
+    def panel(self):
+        self.rerun()
+
+    def venta(self):
+        total = round(self.rng.uniform(20, 500), 2)
+        self.fijar("text_input", "Cliente", f"Carga {self.numero}")
+        self.fijar("text_input", "Producto", "Banner de prueba")
+        self.fijar("number_input", "Total", total)
+        self.fijar("selectbox", "Método de pago", self.rng.choice(METODOS_PAGO))
+        # La mitad de las ventas quedan con saldo para que haya pagos que completar
+        if self.rng.random() < 0.5:
+            self.fijar("radio", "Tipo de pago", "Adelanto")
+            self.rerun()
+            self.fijar("number_input", "Monto adelanto", round(total / 2, 2))
+        else:
+            self.fijar("radio", "Tipo de pago", "Pago completo")
+        self.rerun(self.widget("button", "Registrar venta"))
+
+    def pago(self):
+        confirmar = self.botones_confirmar()
+        if not confirmar:
+            self.rerun()
+            return
+        self.rerun(self.rng.choice(confirmar))
+
+    def correr(self, hasta):
+        """Ejecuta acciones hasta `hasta` (time.time(), común a todos los cajeros)."""
+        acciones = {"venta": self.venta, "pago": self.pago, "panel": self.panel}
+        nombres = list(self.mezcla)
+        pesos = [self.mezcla[n] for n in nombres]
+
+        proximo_refresco = time.time() + INTERVALO_AUTO_REFRESH
+        while time.time() < hasta:
+            nombre = self.rng.choices(nombres, weights=pesos)[0]
+            self.ejecutar(nombre, acciones[nombre])
+
+            fin_pausa = time.time() + self.pausa
+            while self.auto_refresh and proximo_refresco <= min(fin_pausa, hasta):
+                time.sleep(max(0, proximo_refresco - time.time()))
+                self.ejecutar("refresco", self.panel)
+                proximo_refresco += INTERVALO_AUTO_REFRESH
+            time.sleep(max(0, min(fin_pausa, hasta) - time.time()))
+
+class SesionServidor(Cajero):
+    """Un cajero conectado al servidor por websocket, como una pestaña del navegador."""
+
+    def __init__(self, numero, url, mezcla, timeout, pausa, auto_refresh):
+        super().__init__(numero, mezcla, timeout, pausa, auto_refresh)
+        self.url = "ws" + url.rstrip("/")[len("http"):] + "/_stcore/stream"
+        self.ws = None
+        self.conectar()
+
+    def conectar(self):
+        from websockets.sync.client import connect
+
+        self.cerrar()
+        self.ws = connect(self.url, max_size=None, open_timeout=self.timeout)
+        # Lo que el navegador recuerda: valores de widgets y los widgets del último rerun
+        self.estados = {}
+        self.widgets = []
+
+    def cerrar(self):
+        if self.ws is not None:
+            self.ws.close()
+            self.ws = None
+
+    def widget(self, clase, etiqueta):
+        for c, proto in self.widgets:
+            if c == clase and proto.label == etiqueta:
+                return proto
+        raise LookupError(f"No se encontró el widget '{etiqueta}'")
+
+    def fijar(self, clase, etiqueta, valor):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        proto = self.widget(clase, etiqueta)
+        estado = WidgetState(id=proto.id)
+        if clase == "number_input":
+            estado.double_value = valor
+        elif clase in ("selectbox", "radio") and "raw_value" not in proto.DESCRIPTOR.fields_by_name:
+            # Las versiones anteriores de Streamlit mandan el índice de la opción
+            estado.int_value = list(proto.options).index(valor)
+        else:
+            estado.string_value = valor
+        self.estados[proto.id] = estado
+
+    def botones_confirmar(self):
+        return [p for c, p in self.widgets if c == "button" and "-confirmar_" in p.id]
+
+    def rerun(self, boton=None):
+        """Pide un rerun con los valores actuales y espera a que termine, incluido su st.rerun()."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        pedido = BackMsg()
+        pedido.rerun_script.query_string = ""
+        pedido.rerun_script.widget_states.widgets.extend(self.estados.values())
+        if boton is not None:
+            pedido.rerun_script.widget_states.widgets.add(id=boton.id, trigger_value=True)
+
+        inicio = time.perf_counter()
+        widgets, errores = [], []
+        try:
+            self.ws.send(pedido.SerializeToString())
+            while True:
+                restante = inicio + self.timeout - time.perf_counter()
+                if restante <= 0:
+                    raise TimeoutError(f"el rerun no terminó en {self.timeout:.0f}s")
+                mensaje = ForwardMsg()
+                mensaje.ParseFromString(self.ws.recv(timeout=restante))
+                tipo = mensaje.WhichOneof("type")
+                if tipo == "delta" and mensaje.delta.WhichOneof("type") == "new_element":
+                    elemento = mensaje.delta.new_element
+                    clase = elemento.WhichOneof("type")
+                    if clase is None:
+                        continue
+                    proto = getattr(elemento, clase)
+                    if clase == "exception":
+                        errores.append(proto.message)
+                    elif "id" in proto.DESCRIPTOR.fields_by_name and proto.id:
+                        widgets.append((clase, proto))
+                elif tipo == "script_finished":
+                    if mensaje.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                        break
+                    # st.rerun(): el servidor arranca otra ejecución por su cuenta
+                    widgets, errores = [], []
+        except Exception:
+            # Pueden quedar mensajes de la ejecución cortada: se empieza una sesión nueva
+            self.conectar()
+            raise
+        finally:
+            self.reruns.append(time.perf_counter() - inicio)
+
+        self.widgets = widgets
+        vigentes = {proto.id for _, proto in widgets}
+        self.estados = {i: e for i, e in self.estados.items() if i in vigentes}
+        if errores:
+            raise RuntimeError(errores[0])
+
+class SesionAppTest(Cajero):
+    """Un cajero sobre una instancia de AppTest: la app corre dentro del mismo proceso."""
+
+    def __init__(self, numero, secretos, mezcla, timeout, pausa, auto_refresh):
+        super().__init__(numero, mezcla, timeout, pausa, auto_refresh)
+        from streamlit.testing.v1 import AppTest
+
+        self.at = AppTest.from_file(APP, default_timeout=timeout)
+        for clave, valor in secretos.items():
+            self.at.secrets[clave] = valor
+
+    def widget(self, clase, etiqueta):
+        return por_etiqueta(getattr(self.at, clase), etiqueta)
+
+    def fijar(self, clase, etiqueta, valor):
+        self.widget(clase, etiqueta).set_value(valor)
+
+    def botones_confirmar(self):
+        return [b for b in self.at.button if b.key and b.key.startswith("confirmar_")]
+
+    def rerun(self, boton=None):
+        """Un AppTest.run(), incluido el st.rerun() que dispare la acción."""
+        inicio = time.perf_counter()
+        try:
+            (boton.click() if boton is not None else self.at).run()
+        finally:
+            self.reruns.append(time.perf_counter() - inicio)
+        if self.at.exception:
+            raise RuntimeError(self.at.exception[0].message)
+
+# --------------------------------
+# MODO SERVIDOR
+# --------------------------------
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@contextmanager
+def servidor_streamlit(secretos, puerto, puerto_metricas, espera=60):
+    """Levanta `streamlit run appy.py` con estos secrets; devuelve (url, url_metricas) y lo detiene al salir."""
+    carpeta = tempfile.mkdtemp(prefix="prueba_carga_")
+    ruta_secretos = os.path.join(carpeta, "secrets.toml")
+    with open(ruta_secretos, "w", encoding="utf-8") as f:
+        for clave, valor in {**secretos, "METRICS_PORT": puerto_metricas, "METRICS_HOST": "127.0.0.1"}.items():
+            # Un string JSON también es un string básico válido de TOML
+            f.write(f"{clave} = {json.dumps(valor)}\n")
+
+    ruta_log = os.path.join(carpeta, "streamlit.log")
+    with open(ruta_log, "w", encoding="utf-8") as log:
+        proceso = subprocess.Popen(
+            [
+                sys.executable, "-m", "streamlit", "run", APP,
+                "--server.headless", "true",
+                "--server.address", "127.0.0.1",
+                "--server.port", str(puerto),
+                "--browser.gatherUsageStats", "false",
+                "--secrets.files", ruta_secretos,
+            ],
+            cwd=os.path.dirname(APP), stdout=log, stderr=subprocess.STDOUT,
+        )
+    url = f"http://127.0.0.1:{puerto}"
+    try:
+        limite = time.monotonic() + espera
+        while True:
+            if proceso.poll() is not None or time.monotonic() > limite:
+                with open(ruta_log, encoding="utf-8") as log:
+                    raise RuntimeError("No arrancó streamlit run appy.py:\n" + log.read()[-2000:])
+            try:
+                with urllib.request.urlopen(url + "/_stcore/health", timeout=2) as r:
+                    if r.status == 200:
+                        break
+            except OSError:
+                time.sleep(0.5)
+        yield url, f"http://127.0.0.1:{puerto_metricas}/metrics"
+    finally:
+        proceso.terminate()
+        try:
+            proceso.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proceso.kill()
+
+def leer_metricas(url):
+    """Devuelve {muestra: valor} del texto Prometheus, o {} si el endpoint no responde."""
+    if not url:
+        return {}
+    try:
+        with urllib.request.urlopen(url, timeout=5) as r:
+            texto = r.read().decode("utf-8")
+    except OSError:
+        return {}
+    valores = {}
+    for linea in texto.splitlines():
+        if linea and not linea.startswith("#"):
+            muestra, _, valor = linea.rpartition(" ")
+            valores[muestra] = float(valor)
+    return valores
+
+def diferencia(antes, despues, muestra):
+    return despues.get(muestra, 0.0) - antes.get(muestra, 0.0)
+
+def percentil_histograma(antes, despues, nombre, p):
+    """Límite superior del bucket donde cae el percentil `p` de lo observado entre dos lecturas."""
+    prefijo = nombre + '_bucket{le="'
+    buckets = sorted(
+        (float(muestra[len(prefijo):-2]), diferencia(antes, despues, muestra))
+        for muestra in despues if muestra.startswith(prefijo)
+    )
+    if not buckets or not buckets[-1][1]:
+        return 0.0
+    objetivo = math.ceil(p / 100 * buckets[-1][1])
+    return next(limite for limite, acumulado in buckets if acumulado >= objetivo)
+
+class MuestreoPool(threading.Thread):
+    """Lee el gauge de conexiones en uso cada INTERVALO_MUESTREO y guarda el máximo."""
+
+    def __init__(self, url):
+        super().__init__(name="muestreo-pool", daemon=True)
+        self.url = url
+        self.maximo = 0
+        self.detenido = threading.Event()
+
+    def run(self):
+        while not self.detenido.wait(INTERVALO_MUESTREO):
+            en_uso = leer_metricas(self.url).get("nsj_pool_conexiones_en_uso", 0)
+            self.maximo = max(self.maximo, int(en_uso))
+
+    def detener(self):
+        self.detenido.set()
+        self.join()
+
+def _hilo_sesion(numero, url, opciones, barrera, resultados):
+    """Cuerpo de cada cajero: se conecta, espera a los demás y corre la carga."""
+    sesion = None
+    try:
+        sesion = SesionServidor(numero, url, opciones["mezcla"], opciones["timeout"],
+                                opciones["pausa"], opciones["auto_refresh"])
+        # El primer rerun arma la sesión en el servidor: no cuenta para la medición
+        sesion.ejecutar("inicio", sesion.panel)
+        sesion.reiniciar()
+    except Exception as e:
+        error = f"inicio: {e}"
+    esperar_barrera(barrera, opciones["espera_inicio"])
+
+    if sesion is None:
+        resultados.put(resultado_fallido(error))
+        return
+    try:
+        sesion.correr(time.time() + opciones["duracion"])
+    finally:
+        sesion.cerrar()
+    resultados.put(sesion.resultado())
+
+def correr_nivel_servidor(concurrencia, args, url, url_metricas):
+    barrera = threading.Barrier(concurrencia + 1)
+    cola = queue.Queue()
+    hilos = [
+        threading.Thread(target=_hilo_sesion, args=(i, url, opciones_sesion(args), barrera, cola),
+                         name=f"cajero-{i}", daemon=True)
+        for i in range(concurrencia)
+    ]
+    for h in hilos:
+        h.start()
+    esperar_barrera(barrera, espera_inicio(args))
+
+    antes = leer_metricas(url_metricas)
+    muestreo = MuestreoPool(url_metricas)
+    if url_metricas:
+        muestreo.start()
+    inicio = time.time()
+    sesiones = recoger(cola, concurrencia, inicio + args.duracion + args.timeout * 3 + 30)
+    transcurrido = time.time() - inicio
+    if url_metricas:
+        muestreo.detener()
+    despues = leer_metricas(url_metricas)
+    for h in hilos:
+        h.join(timeout=5)
+
+    r = resumir(concurrencia, sesiones, transcurrido)
+    r.update({
+        "pool_p95_ms": percentil_histograma(antes, despues, "nsj_pool_espera_segundos", 95) * 1000,
+        "pool_en_uso_max": muestreo.maximo,
+        "pool_agotado": int(diferencia(antes, despues, "nsj_pool_agotado_total")),
+        "reintentos": int(diferencia(antes, despues, "nsj_lecturas_reintentos_total")),
+    })
+    return r
+
+# --------------------------------
+# MODO PROCESOS (SOLO BASE DE DATOS)
+# --------------------------------
+def _proceso_sesion(numero, secretos, opciones, barrera, resultados):
+    """Cuerpo de cada proceso: prepara la sesión, espera a las demás y corre la carga."""
+    medidor = MedidorPool()
+    sesion = None
+    try:
+        if secretos["DB_BACKEND"] == "postgres":
+            medidor.instalar()
+        sesion = SesionAppTest(numero, secretos, opciones["mezcla"], opciones["timeout"],
+                               opciones["pausa"], opciones["auto_refresh"])
+        # El primer rerun importa la app y abre conexiones: no cuenta para la medición
+        sesion.ejecutar("inicio", sesion.panel)
+        sesion.reiniciar()
+        medidor.reiniciar()
+    except Exception as e:
+        error = f"inicio: {e}"
+    esperar_barrera(barrera, opciones["espera_inicio"])
+
+    if sesion is None:
+        resultados.put(resultado_fallido(error))
+        return
+    sesion.correr(time.time() + opciones["duracion"])
+
+    esperas, agotados = medidor.tomar()
+    resultados.put({**sesion.resultado(), "esperas": esperas, "agotados": agotados})
+
+def correr_nivel_procesos(concurrencia, args, secretos):
+    # spawn: cada proceso arranca limpio, sin heredar el estado de Streamlit del padre
+    contexto = multiprocessing.get_context("spawn")
+    barrera = contexto.Barrier(concurrencia + 1)
+    cola = contexto.Queue()
+    procesos = [
+        contexto.Process(target=_proceso_sesion, args=(i, secretos, opciones_sesion(args), barrera, cola), daemon=True)
+        for i in range(concurrencia)
+    ]
+    for p in procesos:
+        p.start()
+    esperar_barrera(barrera, espera_inicio(args))
+
+    inicio = time.time()
+    sesiones = recoger(cola, concurrencia, inicio + args.duracion + args.timeout * 3 + 30)
+    transcurrido = time.time() - inicio
+    for p in procesos:
+        p.join(timeout=5)
+        if p.is_alive():
+            p.terminate()
+
+    esperas = [e for s in sesiones for e in s.get("esperas", [])]
+    r = resumir(concurrencia, sesiones, transcurrido)
+    r.update({
+        "pool_p95_ms": percentil(esperas, 95) * 1000,
+        "pool_max_ms": max(esperas, default=0.0) * 1000,
+        "pool_agotado": sum(s.get("agotados", 0) for s in sesiones),
+    })
+    return r
+
+# --------------------------------
+# COORDINACIÓN
+# --------------------------------
+def opciones_sesion(args):
+    return {
+        "mezcla": args.mezcla, "timeout": args.timeout, "pausa": args.pausa,
+        "auto_refresh": args.auto_refresh, "duracion": args.duracion,
+        "espera_inicio": espera_inicio(args),
+    }
+
+def espera_inicio(args):
+    # Importar Streamlit y el primer rerun pueden tardar; más que eso es una sesión colgada
+    return args.timeout + 60
+
+def esperar_barrera(barrera, timeout):
+    """Espera a los demás; si alguno no llega a tiempo se arranca igual y cuenta como perdido."""
+    try:
+        barrera.wait(timeout=timeout)
+    except threading.BrokenBarrierError:
+        pass
+
+def recoger(cola, cantidad, limite):
+    sesiones = []
+    while len(sesiones) < cantidad:
+        try:
+            sesiones.append(cola.get(timeout=max(1, limite - time.time())))
+        except queue.Empty:
+            break
+    return sesiones
+
+def resultado_fallido(error):
+    return {"latencias": [], "reruns": [], "acciones": {}, "errores": 1, "mensajes_error": [error]}
+
+# --------------------------------
+# REPORTE
+# --------------------------------
+def percentil(valores, p):
+    """Percentil por rango más cercano."""
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    indice = max(0, math.ceil(p / 100 * len(ordenados)) - 1)
+    return ordenados[indice]
+
+def resumir(concurrencia, sesiones, transcurrido):
+    perdidas = concurrencia - len(sesiones)
+    latencias = [l for s in sesiones for l in s["latencias"]]
+    reruns = [r for s in sesiones for r in s["reruns"]]
+    acciones = len(latencias)
+    errores = sum(s["errores"] for s in sesiones)
+    detalle = {}
+    for s in sesiones:
+        for nombre, cantidad in s["acciones"].items():
+            detalle[nombre] = detalle.get(nombre, 0) + cantidad
+    mensajes_error = [m for s in sesiones for m in s["mensajes_error"]][:5]
+    if perdidas:
+        mensajes_error.insert(0, f"{perdidas} sesión(es) no devolvieron resultados")
+
+    return {
+        "sesiones": concurrencia,
+        "perdidas": perdidas,
+        "acciones": acciones,
+        "throughput": acciones / transcurrido if transcurrido else 0.0,
+        "reruns": len(reruns),
+        "rerun_p50_ms": percentil(reruns, 50) * 1000,
+        "rerun_p95_ms": percentil(reruns, 95) * 1000,
+        "rerun_p99_ms": percentil(reruns, 99) * 1000,
+        "accion_p50_ms": percentil(latencias, 50) * 1000,
+        "accion_p95_ms": percentil(latencias, 95) * 1000,
+        "accion_p99_ms": percentil(latencias, 99) * 1000,
+        "errores": errores,
+        "tasa_error": errores / acciones if acciones else (1.0 if errores or perdidas else 0.0),
+        "detalle": detalle,
+        "mensajes_error": mensajes_error,
+    }
+
+COLUMNAS_COMUNES = [
+    ("sesiones", "Sesiones", "{:>8}"),
+    ("acciones", "Acciones", "{:>8}"),
+    ("throughput", "Acc/s", "{:>8.2f}"),
+    ("rerun_p50_ms", "Rerun p50", "{:>10.1f}"),
+    ("rerun_p95_ms", "Rerun p95", "{:>10.1f}"),
+    ("rerun_p99_ms", "Rerun p99", "{:>10.1f}"),
+    ("accion_p95_ms", "Acción p95", "{:>11.1f}"),
+]
+COLUMNAS = {
+    # Pool p95 es el límite del bucket del histograma de la app (≤ ese valor)
+    "servidor": COLUMNAS_COMUNES + [
+        ("pool_p95_ms", "Pool p95≤", "{:>9.1f}"),
+        ("pool_en_uso_max", "En uso", "{:>7}"),
+        ("pool_agotado", "Agotado", "{:>8}"),
+        ("reintentos", "Reintentos", "{:>10}"),
+        ("tasa_error", "Errores", "{:>8.1%}"),
+    ],
+    "procesos": COLUMNAS_COMUNES + [
+        ("pool_p95_ms", "Pool p95", "{:>9.2f}"),
+        ("pool_max_ms", "Pool max", "{:>9.2f}"),
+        ("pool_agotado", "Agotado", "{:>8}"),
+        ("tasa_error", "Errores", "{:>8.1%}"),
+    ],
+}
+
+def imprimir_encabezado(columnas):
+    print(" ".join(f"{titulo:>{len(fmt.format(0))}}" for _, titulo, fmt in columnas))
+
+def imprimir_fila(columnas, r):
+    print(" ".join(fmt.format(r[clave]) for clave, _, fmt in columnas))
+    if r["mensajes_error"]:
+        for m in r["mensajes_error"]:
+            print(f"    ⚠️ {m}")
+
+def guardar_csv(ruta, resultados):
+    campos = [c for c in resultados[0] if c not in ("detalle", "mensajes_error")]
+    with open(ruta, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.DictWriter(f, fieldnames=campos, extrasaction="ignore")
+        escritor.writeheader()
+        escritor.writerows(resultados)
+
+# --------------------------------
+# CLI
+# --------------------------------
+def leer_mezcla(texto):
+    mezcla = {}
+    for parte in texto.split(","):
+        nombre, _, peso = parte.partition("=")
+        nombre = nombre.strip()
+        if nombre not in ("venta", "pago", "panel"):
+            raise argparse.ArgumentTypeError(f"Acción desconocida: {nombre}")
+        mezcla[nombre] = float(peso)
+    if not any(mezcla.values()):
+        raise argparse.ArgumentTypeError("La mezcla debe tener al menos un peso positivo")
+    return mezcla
+
+def leer_niveles(texto):
+    return [int(n) for n in texto.split(",") if n.strip()]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prueba de carga de sesiones concurrentes de appy.py")
+    parser.add_argument("--niveles", type=leer_niveles, default=[1, 2, 4, 8],
+                        help="Niveles de concurrencia separados por coma (default: 1,2,4,8)")
+    parser.add_argument("--duracion", type=float, default=30,
+                        help="Segundos de carga por nivel (default: 30)")
+    parser.add_argument("--mezcla", type=leer_mezcla, default=leer_mezcla("venta=0.3,pago=0.2,panel=0.5"),
+                        help="Pesos de cada acción (default: venta=0.3,pago=0.2,panel=0.5)")
+    parser.add_argument("--pausa", type=float, default=1.0,
+                        help="Segundos de pausa entre acciones de un cajero (default: 1)")
+    parser.add_argument("--auto-refresh", action="store_true",
+                        help=f"Simula el auto-refresh del sidebar: un rerun cada {INTERVALO_AUTO_REFRESH}s por sesión")
+    parser.add_argument("--timeout", type=float, default=30,
+                        help="Timeout de cada rerun en segundos (default: 30)")
+    parser.add_argument("--modo", choices=["servidor", "procesos"], default="servidor",
+                        help="servidor: N cajeros contra un solo proceso de Streamlit (default); "
+                             "procesos: un proceso con su propio pool por cajero, solo mide la base")
+    parser.add_argument("--url",
+                        help="Servidor de Streamlit ya levantado (modo servidor); por defecto se levanta uno local")
+    parser.add_argument("--metricas-url",
+                        help="Endpoint /metrics del servidor de --url, para las columnas del pool")
+    parser.add_argument("--backend", choices=["postgres", "sqlite"], default="postgres",
+                        help="Motor de datos de la app (default: postgres)")
+    parser.add_argument("--sqlite-path",
+                        help="Archivo SQLite para --backend sqlite (default: uno temporal)")
+    parser.add_argument("--csv", help="Guarda los resultados en este archivo CSV")
+    parser.add_argument("--permitir-remoto", action="store_true",
+                        help="Permite correr contra un host que no sea local")
+    args = parser.parse_args(argv)
+
+    if args.url and args.modo != "servidor":
+        parser.error("--url solo aplica al modo servidor")
+
+    if args.backend == "sqlite":
+        ruta = args.sqlite_path or os.path.join(tempfile.mkdtemp(prefix="prueba_carga_"), "ventas.db")
+        secretos = {"DB_BACKEND": "sqlite", "SQLITE_PATH": ruta}
+    else:
+        secretos = {
+            "DB_BACKEND": "postgres",
+            "DB_HOST": os.environ.get("DB_HOST", "localhost"),
+            "DB_NAME": os.environ.get("DB_NAME", "postgres"),
+            "DB_USER": os.environ.get("DB_USER", "postgres"),
+            "DB_PASSWORD": os.environ.get("DB_PASSWORD", ""),
+            "DB_PORT": os.environ.get("DB_PORT", "5432"),
+        }
+        # Un DB_HOST que empieza con / es el directorio del socket unix: también es local
+        local = secretos["DB_HOST"] in HOSTS_LOCALES or secretos["DB_HOST"].startswith("/")
+        if not args.url and not local and not args.permitir_remoto:
+            parser.error(f"DB_HOST={secretos['DB_HOST']} no es local; la prueba escribe datos. Usa --permitir-remoto.")
+
+    # En SQLite no hay pool que medir: las columnas de pool quedan en cero
+    columnas = COLUMNAS[args.modo]
+    resultados = []
+    descripcion = "un servidor compartido" if args.modo == "servidor" else "procesos separados (solo base de datos)"
+    print(f"Modo: {descripcion} | Motor: {args.backend} | Mezcla: {args.mezcla} | "
+          f"auto-refresh: {'sí' if args.auto_refresh else 'no'} | {args.duracion:.0f}s por nivel")
+
+    with ExitStack() as pila:
+        if args.modo == "servidor" and args.url:
+            url, url_metricas = args.url, args.metricas_url
+        elif args.modo == "servidor":
+            url, url_metricas = pila.enter_context(servidor_streamlit(secretos, puerto_libre(), puerto_libre()))
+        imprimir_encabezado(columnas)
+        for nivel in args.niveles:
+            if args.modo == "servidor":
+                r = correr_nivel_servidor(nivel, args, url, url_metricas)
+            else:
+                r = correr_nivel_procesos(nivel, args, secretos)
+            resultados.append(r)
+            imprimir_fila(columnas, r)
+
+    if args.csv and resultados:
+        guardar_csv(args.csv, resultados)
+        print(f"Resultados guardados en {args.csv}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+"""
+Lecturas resistentes a fallas transitorias de la base de datos.
+
+Las lecturas de los paneles son idempotentes, así que se reintentan con
+backoff exponencial y jitter. Si siguen fallando, un circuito abierto deja de
+consultar la base por un rato (evita tormentas de reintentos sobre una base
+que ya está sufriendo). Mientras tanto, cada panel muestra la última copia
+buena que obtuvo, marcada como obsoleta.
+"""
+import random
+import threading
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import metricas
+
+class BaseNoDisponible(Exception):
+    """La base falló y no hay una copia anterior que mostrar."""
+
+# --------------------------------
+# CIRCUITO
+# --------------------------------
+class Circuito:
+    """
+    Se abre tras `umbral` lecturas fallidas seguidas. Pasado `enfriamiento`
+    deja pasar una sola lectura de prueba: si funciona se cierra, si no vuelve
+    a abrirse por otro `enfriamiento`.
+    """
+
+    def __init__(self, umbral=3, enfriamiento=30):
+        self.umbral = umbral
+        self.enfriamiento = enfriamiento
+        self.fallos = 0
+        self.abierto_hasta = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def abierto(self):
+        return self.fallos >= self.umbral
+
+    def permite(self):
+        with self._lock:
+            if not self.abierto:
+                return True
+            ahora = time.monotonic()
+            if ahora < self.abierto_hasta:
+                return False
+            # Semiabierto: reserva el turno para que solo una lectura haga de prueba
+            self.abierto_hasta = ahora + self.enfriamiento
+            return True
+
+    def exito(self):
+        with self._lock:
+            self.fallos = 0
+            self.abierto_hasta = 0.0
+
+    def fallo(self):
+        with self._lock:
+            self.fallos += 1
+            if self.abierto:
+                self.abierto_hasta = time.monotonic() + self.enfriamiento
+
+# --------------------------------
+# REINTENTOS
+# --------------------------------
+def reintentar(funcion, transitorios, intentos=3, base=0.05, tope=1.0):
+    """Llama a `funcion` hasta `intentos` veces con backoff exponencial y jitter completo."""
+    for intento in range(intentos):
+        try:
+            return funcion()
+        except transitorios:
+            if intento == intentos - 1:
+                raise
+            metricas.REINTENTOS.inc()
+            time.sleep(random.uniform(0, min(tope, base * 2 ** intento)))
+
+# --------------------------------
+# LECTURAS CON COPIA DE RESPALDO
+# --------------------------------
+class Lecturas:
+    """
+    Guarda una sola copia por panel, junto con el día y la consulta que la
+    produjeron: la memoria no crece con los días ni con los clientes
+    consultados, y las copias de días anteriores se descartan.
+    """
+
+    def __init__(self, transitorios, circuito=None, intentos=3):
+        self.transitorios = transitorios
+        self.circuito = circuito or Circuito()
+        self.intentos = intentos
+        # panel -> (valor, hora de la lectura, dia, consulta)
+        self.copias = {}
+        self._dia = None
+        metricas.CIRCUITO_ABIERTO.fijar_funcion(lambda: int(self.circuito.abierto))
+
+    def _descartar_dias_anteriores(self, dia):
+        if dia is None or (self._dia is not None and dia <= self._dia):
+            return
+        self._dia = dia
+        self.copias = {
+            panel: copia for panel, copia in self.copias.items()
+            if copia[2] is None or copia[2] >= dia
+        }
+
+    def leer(self, panel, funcion, dia=None, consulta=None):
+        """
+        Devuelve (valor, obsoleto_desde). `obsoleto_desde` es None si el valor
+        es fresco, o la hora de la copia que se está mostrando en su lugar.
+        La copia solo reemplaza a la lectura si es del mismo `dia` y de la
+        misma `consulta` (p. ej. el cliente cuyo detalle se pide).
+        """
+        self._descartar_dias_anteriores(dia)
+        error = None
+        if self.circuito.permite():
+            try:
+                valor = reintentar(funcion, self.transitorios, self.intentos)
+            except self.transitorios as e:
+                self.circuito.fallo()
+                error = e
+            else:
+                self.circuito.exito()
+                self.copias[panel] = (valor, datetime.now(ZoneInfo("America/Lima")), dia, consulta)
+                return valor, None
+
+        copia = self.copias.get(panel)
+        if copia is None or copia[2:] != (dia, consulta):
+            raise BaseNoDisponible("La base de datos no responde y no hay datos anteriores") from error
+        metricas.LECTURAS_OBSOLETAS.inc()
+        return copia[:2]
@@ -0,0 +1,104 @@
+"""Métricas fragmentadas por hilo y su exposición en texto de Prometheus."""
+import threading
+
+import pytest
+
+from metricas import Contador, Histograma, Medidor
+
+def en_hilos(cantidad, funcion):
+    hilos = [threading.Thread(target=funcion) for _ in range(cantidad)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+
+# --------------------------------
+# FRAGMENTOS
+# --------------------------------
+def test_fragmentos_de_hilos_terminados_se_suman_a_la_base():
+    contador = Contador("prueba_total", "Prueba", ("metodo",))
+    en_hilos(50, lambda: contador.inc(metodo="Yape"))
+    contador.inc(2, metodo="Yape")
+
+    assert contador.valor(metodo="Yape") == 52
+    # Solo queda el fragmento del hilo principal, que sigue vivo
+    assert len(contador._fragmentos) == 1
+    assert contador._base == {("Yape",): 50}
+
+def test_histograma_suma_fragmentos_de_hilos_terminados():
+    histograma = Histograma("prueba_segundos", "Prueba", buckets=(0.1, 1.0))
+    en_hilos(10, lambda: histograma.observe(0.05))
+    en_hilos(10, lambda: histograma.observe(0.5))
+    histograma.observe(5.0)
+
+    lineas = histograma.exponer()
+    assert 'prueba_segundos_bucket{le="0.1"} 10' in lineas
+    assert 'prueba_segundos_bucket{le="1"} 20' in lineas
+    assert 'prueba_segundos_bucket{le="+Inf"} 21' in lineas
+    assert "prueba_segundos_count 21" in lineas
+    assert len(histograma._fragmentos) == 1
+
+# --------------------------------
+# ETIQUETAS
+# --------------------------------
+def test_etiquetas_faltantes_o_de_mas():
+    contador = Contador("prueba_total", "Prueba", ("metodo",))
+    with pytest.raises(ValueError):
+        contador.inc()
+    with pytest.raises(ValueError):
+        contador.inc(metodo="Yape", cajero="1")
+    with pytest.raises(ValueError):
+        contador.inc(cajero="1")
+
+def test_valores_de_etiqueta_se_escapan():
+    contador = Contador("prueba_total", "Prueba", ("cliente",))
+    contador.inc(cliente='Ana "la del\\ banner"\n')
+
+    assert contador.exponer()[-1] == 'prueba_total{cliente="Ana \\"la del\\\\ banner\\"\\n"} 1'
+
+# --------------------------------
+# EXPOSICIÓN
+# --------------------------------
+def test_contador_sin_etiquetas_expone_cero():
+    assert Contador("prueba_total", "Prueba").exponer() == [
+        "# HELP prueba_total Prueba",
+        "# TYPE prueba_total counter",
+        "prueba_total 0",
+    ]
+
+def test_exposicion_de_histograma():
+    histograma = Histograma("prueba_segundos", "Prueba", ("tipo",), buckets=(0.5, 1.0))
+    histograma.observe(0.25, tipo="completa")
+    histograma.observe(0.75, tipo="completa")
+    histograma.observe(2.0, tipo="fragmento")
+
+    assert histograma.exponer() == [
+        "# HELP prueba_segundos Prueba",
+        "# TYPE prueba_segundos histogram",
+        'prueba_segundos_bucket{tipo="completa",le="0.5"} 1',
+        'prueba_segundos_bucket{tipo="completa",le="1"} 2',
+        'prueba_segundos_bucket{tipo="completa",le="+Inf"} 2',
+        'prueba_segundos_sum{tipo="completa"} 1',
+        'prueba_segundos_count{tipo="completa"} 2',
+        'prueba_segundos_bucket{tipo="fragmento",le="0.5"} 0',
+        'prueba_segundos_bucket{tipo="fragmento",le="1"} 0',
+        'prueba_segundos_bucket{tipo="fragmento",le="+Inf"} 1',
+        'prueba_segundos_sum{tipo="fragmento"} 2',
+        'prueba_segundos_count{tipo="fragmento"} 1',
+    ]
+
+def test_limite_del_bucket_es_inclusivo():
+    histograma = Histograma("prueba_segundos", "Prueba", buckets=(0.5,))
+    histograma.observe(0.5)
+
+    assert 'prueba_segundos_bucket{le="0.5"} 1' in histograma.exponer()
+
+def test_medidor_ignora_errores_de_su_funcion():
+    medidor = Medidor("prueba_en_uso", "Prueba")
+    assert medidor.exponer() == ["# HELP prueba_en_uso Prueba", "# TYPE prueba_en_uso gauge"]
+
+    medidor.fijar_funcion(lambda: 3)
+    assert medidor.exponer()[-1] == "prueba_en_uso 3"
+
+    medidor.fijar_funcion(lambda: 1 / 0)
+    assert len(medidor.exponer()) == 2
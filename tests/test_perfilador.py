@@ -0,0 +1,52 @@
+"""La captura de cProfile se libera aunque la ejecución termine en una excepción."""
+import pytest
+
+import perfilador
+from perfilador import Perfilador
+
+def test_ejecucion_cortada_libera_la_captura():
+    perfil = Perfilador()
+    perfil.captura_pendiente = True
+    perfil.iniciar_ejecucion()
+    assert perfilador._LOCK_CAPTURA.locked()
+
+    # Lo mismo que hace el finally de appy.py
+    with pytest.raises(RuntimeError):
+        try:
+            raise RuntimeError("st.rerun() o un error del script")
+        finally:
+            perfil.finalizar_ejecucion(interrumpida=True)
+
+    assert not perfilador._LOCK_CAPTURA.locked()
+    assert perfil.captura["interrumpida"]
+    assert perfil.ejecuciones[0]["interrumpida"]
+
+def test_fragmento_con_error_libera_la_captura():
+    perfil = Perfilador()
+    perfil.activo = True
+    perfil.captura_pendiente = True
+
+    with pytest.raises(ZeroDivisionError):
+        with perfil.fragmento("fragmento de prueba"):
+            assert perfilador._LOCK_CAPTURA.locked()
+            1 / 0
+
+    assert not perfilador._LOCK_CAPTURA.locked()
+    assert perfil.ejecuciones[0]["tipo"] == "fragmento"
+    assert perfil.ejecuciones[0]["interrumpida"]
+
+def test_segunda_captura_espera_a_la_primera():
+    primera, segunda = Perfilador(), Perfilador()
+    primera.captura_pendiente = segunda.captura_pendiente = True
+
+    primera.iniciar_ejecucion()
+    segunda.iniciar_ejecucion()
+    assert segunda.aviso is not None
+    primera.finalizar_ejecucion()
+
+    segunda.captura_pendiente = True
+    segunda.iniciar_ejecucion()
+    assert perfilador._LOCK_CAPTURA.locked()
+    segunda.finalizar_ejecucion()
+    assert segunda.captura is not None
+    assert not perfilador._LOCK_CAPTURA.locked()
@@ -0,0 +1,226 @@
+"""
+Contrato de RepositorioVentas: las mismas pruebas corren contra cada motor.
+
+SQLite usa un archivo temporal. Postgres solo corre si DB_HOST está definido
+(junto con DB_NAME, DB_USER, DB_PASSWORD y DB_PORT) y debe apuntar a una base
+de pruebas: las tablas se vacían antes de cada prueba.
+
+    pytest
+"""
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+
+import pytest
+
+import database
+from database import LIMA
+
+HOY = date(2026, 3, 15)
+
+def momento(dia, hora=10):
+    return datetime(dia.year, dia.month, dia.day, hora, 30, tzinfo=LIMA)
+
+def venta(cliente="Ana", total=100.0, pagado=None, metodo="Efectivo", entrega="Pendiente"):
+    pagado = total if pagado is None else pagado
+    saldo = total - pagado
+    return {
+        "Cliente": cliente, "Producto": "Polo", "Total": total,
+        "Pagado": pagado, "Saldo": saldo, "Estado": "Pendiente" if saldo > 0 else "Pagado",
+        "Método de pago": metodo, "Entrega": entrega
+    }
+
+# --------------------------------
+# MOTORES
+# --------------------------------
+@pytest.fixture(params=["sqlite", "postgres"])
+def repo(request, tmp_path):
+    if request.param == "sqlite":
+        repo = database.crear_repositorio({"DB_BACKEND": "sqlite", "SQLITE_PATH": str(tmp_path / "ventas.db")})
+        repo.asegurar_esquema()
+        return repo
+
+    if not os.environ.get("DB_HOST"):
+        pytest.skip("DB_HOST no definido: sin Postgres de pruebas")
+    pytest.importorskip("psycopg2")
+    repo = database.crear_repositorio(os.environ)
+    repo.asegurar_esquema()
+    with repo._cursor() as cur:
+        cur.execute("TRUNCATE pagos, ventas, cierres_caja, cuentas_por_cobrar RESTART IDENTITY")
+    return repo
+
+# --------------------------------
+# VENTAS Y PAGOS
+# --------------------------------
+def test_registrar_venta_y_listar(repo):
+    id_hoy = repo.registrar_venta(venta("Ana"), momento(HOY))
+    id_ayer = repo.registrar_venta(venta("Beto"), momento(HOY - timedelta(days=1)))
+
+    assert id_hoy != id_ayer
+    assert [v["id"] for v in repo.listar_ventas(HOY, "hoy")] == [id_hoy]
+    assert [v["id"] for v in repo.listar_ventas(HOY, "anteriores")] == [id_ayer]
+    assert [v["id"] for v in repo.listar_ventas()] == [id_hoy, id_ayer]
+
+    v = repo.listar_ventas(HOY, "hoy")[0]
+    assert v["Cliente"] == "Ana"
+    assert v["Total"] == 100.0 and v["Pagado"] == 100.0 and v["Saldo"] == 0.0
+    assert v["Fecha"] == momento(HOY)
+
+def test_totales_del_dia(repo):
+    repo.registrar_venta(venta(total=100.0, metodo="Yape"), momento(HOY))
+    repo.registrar_venta(venta(total=50.0, pagado=20.0, metodo="Efectivo"), momento(HOY))
+    repo.registrar_venta(venta(total=70.0), momento(HOY - timedelta(days=1)))
+
+    assert repo.totales_del_dia(HOY) == (150.0, 120.0, 30.0)
+    assert repo.pagos_por_metodo(HOY) == [("Yape", 1, 100.0), ("Efectivo", 1, 20.0)]
+    assert repo.total_cobrado(HOY) == 120.0
+
+def test_venta_sin_adelanto_no_registra_pago(repo):
+    repo.registrar_venta(venta(total=40.0, pagado=0.0), momento(HOY))
+
+    assert repo.pagos_por_metodo(HOY) == []
+    assert repo.total_cobrado(HOY) == 0.0
+
+def test_completar_pago_cobra_el_saldo_de_la_base(repo):
+    id_venta = repo.registrar_venta(venta(total=80.0, pagado=30.0), momento(HOY - timedelta(days=2)))
+
+    assert repo.completar_pago(id_venta, "Plin", momento(HOY)) == 50.0
+
+    v = repo.listar_ventas()[0]
+    assert (v["Pagado"], v["Saldo"], v["Estado"]) == (80.0, 0.0, "Pagado")
+    assert repo.pagos_por_metodo(HOY) == [("Plin", 1, 50.0)]
+    assert repo.cuentas_por_cobrar(HOY) == []
+
+def test_completar_pago_dos_veces_no_duplica_el_cobro(repo):
+    id_venta = repo.registrar_venta(venta(total=80.0, pagado=30.0), momento(HOY))
+
+    assert repo.completar_pago(id_venta, "Yape", momento(HOY)) == 50.0
+    assert repo.completar_pago(id_venta, "Yape", momento(HOY)) == 0.0
+    assert repo.total_cobrado(HOY) == 80.0
+    assert repo.listar_ventas()[0]["Pagado"] == 80.0
+
+def test_completar_pago_de_venta_eliminada(repo):
+    id_venta = repo.registrar_venta(venta(total=80.0, pagado=30.0), momento(HOY))
+    repo.eliminar_venta(id_venta)
+
+    with pytest.raises(database.VentaNoEncontrada):
+        repo.completar_pago(id_venta, "Efectivo", momento(HOY))
+
+def test_marcar_entrega(repo):
+    id_venta = repo.registrar_venta(venta(), momento(HOY))
+
+    repo.marcar_entrega(id_venta, "Entregado")
+    assert repo.listar_ventas()[0]["Entrega"] == "Entregado"
+    repo.marcar_entrega(id_venta, "Pendiente")
+    assert repo.listar_ventas()[0]["Entrega"] == "Pendiente"
+
+def test_eliminar_venta(repo):
+    id_venta = repo.registrar_venta(venta(total=60.0, pagado=10.0), momento(HOY))
+    otra = repo.registrar_venta(venta("Beto"), momento(HOY))
+
+    repo.eliminar_venta(id_venta)
+
+    assert [v["id"] for v in repo.listar_ventas()] == [otra]
+    assert repo.total_cobrado(HOY) == 100.0
+    assert repo.detalle_cuenta("Ana") == []
+
+# --------------------------------
+# CIERRES Y LIMPIEZA
+# --------------------------------
+def test_cierre_de_caja(repo):
+    assert repo.cierre_de_caja("admin", momento(HOY, 18)) is None
+
+    repo.registrar_venta(venta(total=100.0, metodo="Yape", entrega="Entregado"), momento(HOY))
+    repo.registrar_venta(venta(total=40.0, metodo="Efectivo", entrega="Entregado"), momento(HOY))
+    # No entran al cierre: sin entregar, o entregada con saldo
+    sin_entregar = repo.registrar_venta(venta(total=25.0), momento(HOY))
+    con_saldo = repo.registrar_venta(venta(total=30.0, pagado=10.0, entrega="Entregado"), momento(HOY))
+
+    assert repo.cierre_de_caja("admin", momento(HOY, 18)) == 140.0
+    assert sorted(v["id"] for v in repo.listar_ventas()) == sorted([sin_entregar, con_saldo])
+    assert repo.cierre_de_caja("admin", momento(HOY, 19)) is None
+
+    cierres = repo.obtener_cierres()
+    assert len(cierres) == 1
+    fecha, general, efectivo, yape, plin, transferencia, usuario, creado = cierres[0]
+    assert fecha == HOY
+    assert (general, efectivo, yape, plin, transferencia) == (140.0, 40.0, 100.0, 0.0, 0.0)
+    assert usuario == "admin"
+    # SQLite guarda la hora del cierre; Postgres, la del servidor (DEFAULT now())
+    assert creado.tzinfo is not None
+
+def test_obtener_cierres_del_mas_reciente_al_mas_antiguo(repo):
+    repo.registrar_venta(venta(entrega="Entregado"), momento(HOY - timedelta(days=1)))
+    repo.cierre_de_caja("admin", momento(HOY - timedelta(days=1), 18))
+    repo.registrar_venta(venta(entrega="Entregado"), momento(HOY))
+    repo.cierre_de_caja("admin", momento(HOY, 18))
+
+    assert [c[0] for c in repo.obtener_cierres()] == [HOY, HOY - timedelta(days=1)]
+
+def test_limpiar_dia(repo):
+    repo.registrar_venta(venta(total=50.0, pagado=20.0), momento(HOY))
+    repo.registrar_venta(venta(total=30.0, pagado=0.0), momento(HOY))
+    anterior = repo.registrar_venta(venta(total=90.0, pagado=40.0), momento(HOY - timedelta(days=3)))
+
+    assert repo.limpiar_dia(HOY) == (2, 1)
+    assert [v["id"] for v in repo.listar_ventas()] == [anterior]
+    assert repo.totales_del_dia(HOY) == (0.0, 0.0, 0.0)
+    assert repo.detalle_cuenta("Ana") == [(HOY - timedelta(days=3), 50.0)]
+
+# --------------------------------
+# CUENTAS POR COBRAR
+# --------------------------------
+def test_cuentas_por_cobrar_por_antiguedad(repo):
+    repo.registrar_venta(venta("Ana", 100.0, 40.0), momento(HOY))
+    repo.registrar_venta(venta("Ana", 50.0, 0.0), momento(HOY - timedelta(days=10)))
+    repo.registrar_venta(venta("Ana", 30.0, 10.0), momento(HOY - timedelta(days=40)))
+    repo.registrar_venta(venta("Beto", 25.0, 5.0), momento(HOY - timedelta(days=7)))
+    repo.registrar_venta(venta("Caro", 60.0), momento(HOY))
+
+    assert repo.cuentas_por_cobrar(HOY) == [
+        ("Ana", 60.0, 50.0, 20.0, 130.0, HOY - timedelta(days=40)),
+        ("Beto", 20.0, 0.0, 0.0, 20.0, HOY - timedelta(days=7)),
+    ]
+    assert repo.detalle_cuenta("Ana") == [
+        (HOY - timedelta(days=40), 20.0),
+        (HOY - timedelta(days=10), 50.0),
+        (HOY, 60.0),
+    ]
+
+def test_cuentas_por_cobrar_suma_ventas_del_mismo_dia(repo):
+    primera = repo.registrar_venta(venta("Ana", 100.0, 40.0), momento(HOY, 9))
+    repo.registrar_venta(venta("Ana", 20.0, 5.0), momento(HOY, 11))
+    assert repo.detalle_cuenta("Ana") == [(HOY, 75.0)]
+
+    repo.completar_pago(primera, "Efectivo", momento(HOY, 12))
+    assert repo.detalle_cuenta("Ana") == [(HOY, 15.0)]
+
+def test_adelanto_mayor_al_total_no_genera_deuda(repo):
+    repo.registrar_venta(venta("Ana", 20.0, 5.0), momento(HOY))
+    excedida = repo.registrar_venta(venta("Ana", 10.0, 15.0), momento(HOY))
+    assert repo.detalle_cuenta("Ana") == [(HOY, 15.0)]
+
+    repo.eliminar_venta(excedida)
+    assert repo.detalle_cuenta("Ana") == [(HOY, 15.0)]
+
+# --------------------------------
+# SQLITE: ERRORES TRANSITORIOS
+# --------------------------------
+def test_sqlite_solo_reintenta_base_ocupada(tmp_path):
+    ruta = str(tmp_path / "ventas.db")
+    repo = database.RepositorioSQLite(ruta)
+    repo.asegurar_esquema()
+
+    bloqueo = sqlite3.connect(ruta, isolation_level=None)
+    bloqueo.execute("BEGIN EXCLUSIVE")
+    # Conexión sin espera para no aguardar el timeout del repositorio
+    repo.liberar_conexion(sqlite3.connect(ruta, isolation_level=None, timeout=0))
+    with pytest.raises(repo.errores_transitorios):
+        repo.registrar_venta(venta(), momento(HOY))
+    bloqueo.rollback()
+    bloqueo.close()
+
+    with pytest.raises(sqlite3.OperationalError) as error:
+        with repo._cursor() as cur:
+            cur.execute("SELECT * FROM no_existe")
+    assert not isinstance(error.value, repo.errores_transitorios)
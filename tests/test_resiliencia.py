@@ -0,0 +1,135 @@
+"""Circuito y copias de respaldo de las lecturas de los paneles."""
+from datetime import date, timedelta
+
+import pytest
+
+import resiliencia
+from resiliencia import BaseNoDisponible, Circuito, Lecturas
+
+HOY = date(2026, 3, 15)
+
+class Caida(Exception):
+    """Error transitorio de prueba."""
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(resiliencia.time, "monotonic", reloj)
+    monkeypatch.setattr(resiliencia.time, "sleep", lambda segundos: None)
+    return reloj
+
+def falla():
+    raise Caida("sin conexión")
+
+# --------------------------------
+# CIRCUITO
+# --------------------------------
+def test_circuito_se_abre_tras_umbral_fallos(reloj):
+    circuito = Circuito(umbral=3, enfriamiento=30)
+    for _ in range(2):
+        circuito.fallo()
+        assert circuito.permite()
+
+    circuito.fallo()
+    assert circuito.abierto
+    assert not circuito.permite()
+
+def test_circuito_semiabierto_deja_pasar_una_sola_prueba(reloj):
+    circuito = Circuito(umbral=1, enfriamiento=30)
+    circuito.fallo()
+    reloj.ahora += 29
+    assert not circuito.permite()
+
+    reloj.ahora += 1
+    assert circuito.permite()
+    assert not circuito.permite()
+    assert not circuito.permite()
+
+def test_prueba_fallida_vuelve_a_abrir(reloj):
+    circuito = Circuito(umbral=1, enfriamiento=30)
+    circuito.fallo()
+    reloj.ahora += 30
+    assert circuito.permite()
+
+    circuito.fallo()
+    reloj.ahora += 29
+    assert not circuito.permite()
+    reloj.ahora += 1
+    assert circuito.permite()
+
+def test_prueba_exitosa_cierra_el_circuito(reloj):
+    circuito = Circuito(umbral=1, enfriamiento=30)
+    circuito.fallo()
+    reloj.ahora += 30
+    assert circuito.permite()
+
+    circuito.exito()
+    assert not circuito.abierto
+    assert circuito.permite() and circuito.permite()
+
+# --------------------------------
+# LECTURAS
+# --------------------------------
+def test_lectura_fallida_sirve_la_copia_obsoleta(reloj):
+    lecturas = Lecturas(Caida, Circuito(umbral=3))
+    assert lecturas.leer("ventas_hoy", lambda: [1, 2], dia=HOY) == ([1, 2], None)
+
+    valor, obsoleto_desde = lecturas.leer("ventas_hoy", falla, dia=HOY)
+    assert valor == [1, 2]
+    assert obsoleto_desde is not None
+
+def test_circuito_abierto_sirve_la_copia_sin_consultar(reloj):
+    lecturas = Lecturas(Caida, Circuito(umbral=1))
+    lecturas.leer("cierres", lambda: ["cierre"])
+    lecturas.leer("cierres", falla)
+
+    consultas = []
+    valor, obsoleto_desde = lecturas.leer("cierres", lambda: consultas.append(1))
+    assert consultas == []
+    assert valor == ["cierre"] and obsoleto_desde is not None
+
+def test_sin_copia_lanza_base_no_disponible(reloj):
+    lecturas = Lecturas(Caida)
+    with pytest.raises(BaseNoDisponible) as error:
+        lecturas.leer("cobranzas", falla, dia=HOY)
+    assert isinstance(error.value.__cause__, Caida)
+
+def test_reintenta_antes_de_rendirse(reloj):
+    intentos = []
+
+    def falla_dos_veces():
+        intentos.append(1)
+        if len(intentos) < 3:
+            raise Caida("ocupada")
+        return "ok"
+
+    lecturas = Lecturas(Caida, intentos=3)
+    assert lecturas.leer("ventas", falla_dos_veces) == ("ok", None)
+    assert not lecturas.circuito.fallos
+
+def test_copia_de_otra_consulta_no_se_sirve(reloj):
+    lecturas = Lecturas(Caida)
+    lecturas.leer("detalle_cuenta", lambda: [("Ana", 10.0)], dia=HOY, consulta="Ana")
+
+    with pytest.raises(BaseNoDisponible):
+        lecturas.leer("detalle_cuenta", falla, dia=HOY, consulta="Beto")
+
+def test_una_copia_por_panel_y_sin_dias_anteriores(reloj):
+    lecturas = Lecturas(Caida)
+    for cliente in ("Ana", "Beto", "Caro"):
+        lecturas.leer("detalle_cuenta", lambda: cliente, dia=HOY, consulta=cliente)
+    lecturas.leer("cierres", lambda: [])
+    assert set(lecturas.copias) == {"detalle_cuenta", "cierres"}
+
+    manana = HOY + timedelta(days=1)
+    lecturas.leer("ventas_hoy", lambda: [], dia=manana)
+    assert set(lecturas.copias) == {"ventas_hoy", "cierres"}
+    with pytest.raises(BaseNoDisponible):
+        lecturas.leer("detalle_cuenta", falla, dia=manana, consulta="Caro")